@@ -0,0 +1,329 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+DEFAULT_PREDICTION_LOG_PATH = '../data/accuracy/predictions.bin'
+DEFAULT_STATE_PATH = '../data/accuracy/state.json'
+
+# Expected spacing of collected observations; a prediction is matched to the
+# observation nearest its target time within half of it
+SAMPLING_INTERVAL_SECONDS = 60 * 60
+
+# A series has a fixed step when this share of its timestamp differences
+# lies within STEP_TOLERANCE of their median
+MIN_REGULAR_FRACTION = 0.9
+STEP_TOLERANCE = 0.5
+
+# Older scored predictions count half as much after this long
+DEFAULT_HALF_LIFE_SECONDS = 7 * 24 * 60 * 60
+
+CITY_BYTES = 32
+
+# Fixed-size records so the log can be appended without framing and read
+# back with a single np.fromfile
+PREDICTION_DTYPE = [
+    ('issued_at', '<f8'),
+    ('target_time', '<f8'),
+    ('horizon', '<u2'),
+    ('alpha', '<f4'),
+    ('predicted', '<f4'),
+    ('lower', '<f4'),
+    ('upper', '<f4'),
+    ('scope', 'u1'),
+    ('city', f'S{CITY_BYTES}'),
+    ('model_version', 'S12')
+]
+
+SCOPES = ('global', 'city')
+
+
+def _encode_city(city):
+    return (city or '').encode('utf-8')[:CITY_BYTES]
+
+
+def step_interval(timestamps):
+    """
+    Duration of one step of a modelled series, from its observation times.
+
+    :param timestamps: Timestamps of the series' observations in model order
+    :return: Median step in seconds, or None when the series has no fixed
+        step, e.g. several cities interleaved or an irregular collection cadence
+    """
+    import numpy as np
+    import pandas as pd
+    from data_preprocessing import parse_timestamps
+
+    times = parse_timestamps(pd.Series(timestamps), utc=True).astype('int64').to_numpy() / 1e9
+    steps = np.diff(times)
+    if not len(steps) or np.any(steps <= 0):
+        return None
+    median = float(np.median(steps))
+    regular = np.abs(steps - median) <= STEP_TOLERANCE * median
+    return median if regular.mean() >= MIN_REGULAR_FRACTION else None
+
+
+def forecast_origin(model_data, default):
+    """
+    Epoch seconds of the last observation the model was fitted on.
+
+    :param model_data: Model data dict from the ModelRegistry
+    :param default: Returned when the model has no usable last_timestamp
+    """
+    try:
+        origin = datetime.fromisoformat(str(model_data['last_timestamp']))
+    except (KeyError, ValueError):
+        return default
+    # Collected timestamps are naive UTC
+    if origin.tzinfo is None:
+        origin = origin.replace(tzinfo=timezone.utc)
+    return origin.timestamp()
+
+
+class PredictionLog:
+    """
+    Append-only log of served forecasts as fixed-size binary records.
+
+    The file is opened once, unbuffered and in append mode, and each record
+    is a single write, so several service workers can share one log.
+    """
+
+    def __init__(self, path=DEFAULT_PREDICTION_LOG_PATH):
+        """
+        :param path: Log file path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def append(self, model_data, city, steps, alpha, predicted, lower, upper, scope='global',
+               issued_at=None):
+        """
+        Record one served forecast.
+
+        :param model_data: Model data dict the forecast came from
+        :param city: Requested city, may be None for the global model
+        :param steps: Forecast horizon
+        :param alpha: Significance level of the interval
+        :param predicted: Predicted mean
+        :param lower: Interval lower bound
+        :param upper: Interval upper bound
+        :param scope: 'global' or 'city' depending on which model served it
+        :param issued_at: Time the forecast was served, defaults to time.time()
+        :return: True if recorded. Forecasts of models without a step_seconds
+            entry have no target time and are skipped
+        """
+        step_seconds = model_data.get('step_seconds')
+        if not step_seconds:
+            return False
+
+        # numpy is already imported by the loaded model at this point
+        import numpy as np
+
+        issued_at = time.time() if issued_at is None else issued_at
+        record = np.zeros(1, dtype=PREDICTION_DTYPE)
+        record['issued_at'] = issued_at
+        record['target_time'] = forecast_origin(model_data, issued_at) + steps * float(step_seconds)
+        record['horizon'] = steps
+        record['alpha'] = alpha
+        record['predicted'] = predicted
+        record['lower'] = lower
+        record['upper'] = upper
+        record['scope'] = SCOPES.index(scope)
+        record['city'] = _encode_city(city)
+        record['model_version'] = model_data.get('version', '').encode('ascii')
+
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'ab', buffering=0)
+            self._file.write(record.tobytes())
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def read(self, start=0):
+        """
+        Records from index ``start`` to the end of the log.
+
+        A partially written trailing record is ignored.
+        """
+        import numpy as np
+
+        itemsize = np.dtype(PREDICTION_DTYPE).itemsize
+        if not os.path.exists(self.path):
+            return np.zeros(0, dtype=PREDICTION_DTYPE)
+        count = os.path.getsize(self.path) // itemsize - start
+        if count <= 0:
+            return np.zeros(0, dtype=PREDICTION_DTYPE)
+        return np.fromfile(self.path, dtype=PREDICTION_DTYPE, count=count, offset=start * itemsize)
+
+
+def _empty_stats():
+    return {'weight': 0.0, 'abs_error': 0.0, 'squared_error': 0.0,
+            'covered': 0.0, 'nominal': 0.0, 'count': 0}
+
+
+class AccuracyTracker:
+    """
+    Rolling accuracy of served forecasts, scored as observations arrive.
+
+    Each batch of collected observations is joined with logged predictions
+    on city and target time (within half a sampling interval). Absolute and
+    squared errors and interval hits are added to exponentially decayed
+    sums per model scope and horizon, kept in a small JSON state file
+    together with the log offset, so every update only reads predictions
+    that can still be scored. Each prediction is scored at most once.
+    """
+
+    def __init__(self, log=None, state_path=DEFAULT_STATE_PATH,
+                 half_life=DEFAULT_HALF_LIFE_SECONDS, interval=SAMPLING_INTERVAL_SECONDS):
+        """
+        :param log: PredictionLog to score, defaults to the default log path
+        :param state_path: Path of the JSON state file
+        :param half_life: Seconds after which a scored prediction's weight halves
+        :param interval: Sampling interval of the observations, in seconds
+        """
+        self.log = log or PredictionLog()
+        self.state_path = state_path
+        self.half_life = half_life
+        self.tolerance = interval / 2
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {'offset': 0, 'watermark': None, 'updated_at': None, 'stats': {}}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _decay(self, state, now):
+        if state['updated_at'] is None:
+            return
+        factor = 0.5 ** (max(now - state['updated_at'], 0.0) / self.half_life)
+        for horizons in state['stats'].values():
+            for stats in horizons.values():
+                for key in ('weight', 'abs_error', 'squared_error', 'covered', 'nominal'):
+                    stats[key] *= factor
+
+    def update(self, observations, now=None):
+        """
+        Score logged predictions against newly collected observations.
+
+        :param observations: DataFrame with 'city', 'timestamp' and 'aqi' columns
+        :param now: Current time, defaults to time.time()
+        :return: Number of predictions scored
+        """
+        import numpy as np
+        import pandas as pd
+        from data_preprocessing import parse_timestamps
+
+        now = time.time() if now is None else now
+        state = self.load_state()
+        self._decay(state, now)
+        state['updated_at'] = now
+
+        obs = observations[['city', 'timestamp', 'aqi']].dropna()
+        records = self.log.read(state['offset'])
+        scored = 0
+        if len(obs) and len(records):
+            obs = pd.DataFrame({
+                'city': [_encode_city(city) for city in obs['city']],
+                'observed_time': parse_timestamps(obs['timestamp'], utc=True).astype('int64').to_numpy() / 1e9,
+                'observed': obs['aqi'].astype(float).to_numpy()
+            })
+            lower_bound = obs['observed_time'].min() - self.tolerance
+            if state['watermark'] is not None:
+                lower_bound = max(lower_bound, state['watermark'])
+            upper_bound = obs['observed_time'].max() + self.tolerance
+
+            target_time = records['target_time']
+            candidates = records[(target_time > lower_bound) & (target_time <= upper_bound)]
+            if len(candidates):
+                predictions = pd.DataFrame({name: candidates[name] for name in candidates.dtype.names})
+                matched = pd.merge_asof(
+                    predictions.sort_values('target_time'),
+                    obs.sort_values('observed_time'),
+                    left_on='target_time', right_on='observed_time', by='city',
+                    tolerance=self.tolerance, direction='nearest'
+                ).dropna(subset=['observed'])
+                scored = len(matched)
+                self._accumulate(state, matched)
+
+            state['watermark'] = max(lower_bound, upper_bound)
+            # Skip the prefix that can no longer match a future batch
+            pending = np.flatnonzero(target_time > state['watermark'])
+            state['offset'] += int(pending[0]) if len(pending) else len(records)
+
+        self._save_state(state)
+        return scored
+
+    def _accumulate(self, state, matched):
+        if matched.empty:
+            return
+        error = matched['predicted'] - matched['observed']
+        matched = matched.assign(
+            scope_name=[SCOPES[scope] for scope in matched['scope']],
+            abs_error=error.abs(),
+            squared_error=error ** 2,
+            covered=((matched['lower'] <= matched['observed'])
+                     & (matched['observed'] <= matched['upper'])).astype(float),
+            nominal=1 - matched['alpha']
+        )
+        columns = ['abs_error', 'squared_error', 'covered', 'nominal']
+        for scope, by_scope in matched.groupby('scope_name'):
+            horizons = state['stats'].setdefault(scope, {})
+            groups = [('all', by_scope)] + [(str(h), group) for h, group in by_scope.groupby('horizon')]
+            for horizon, group in groups:
+                stats = horizons.setdefault(horizon, _empty_stats())
+                sums = group[columns].sum()
+                stats['weight'] += len(group)
+                stats['count'] += len(group)
+                for column in columns:
+                    stats[column] += float(sums[column])
+
+    def summary(self, scope='global', horizon='all'):
+        """
+        Rolling accuracy for one model scope and horizon.
+
+        :param scope: 'global' or 'city'
+        :param horizon: Forecast horizon as a string, or 'all'
+        :return: Dict with mae, rmse, coverage, nominal_coverage and count,
+            or None if nothing has been scored yet
+        """
+        stats = self.load_state()['stats'].get(scope, {}).get(str(horizon))
+        return summarize(stats)
+
+    def reset(self, scope):
+        """
+        Drop the accumulated accuracy of ``scope``, e.g. after a full retrain.
+        """
+        state = self.load_state()
+        state['stats'].pop(scope, None)
+        self._save_state(state)
+
+
+def summarize(stats):
+    """
+    Rolling metrics from accumulated sums, or None when they are empty.
+    """
+    if not stats or stats['weight'] <= 0:
+        return None
+    weight = stats['weight']
+    return {
+        'mae': stats['abs_error'] / weight,
+        'rmse': (stats['squared_error'] / weight) ** 0.5,
+        'coverage': stats['covered'] / weight,
+        'nominal_coverage': stats['nominal'] / weight,
+        'count': stats['count']
+    }
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def build_session(pool_size=10, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR):
+    """
+    Create a requests session that reuses connections and retries transient failures.
+
+    :param pool_size: Connections kept alive per host
+    :param retries: Retries for connection errors and retryable status codes
+    :param backoff_factor: Exponential backoff factor between retries
+    :return: Configured requests.Session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting requests to one upstream.
+
+    Tokens refill continuously at ``rate_per_minute``; ``capacity`` bounds
+    the burst. acquire() blocks until a token is available and records how
+    long callers were throttled.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, sleeping until one is available.
+
+        :return: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.wait_seconds += waited
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ResponseCache:
+    """
+    TTL cache of upstream JSON responses with per-key request coalescing.
+
+    Concurrent misses on the same key wait for the first caller's request
+    instead of issuing their own. Entries live only as long as the cache
+    object, i.e. one collection run; sharing them across runs would record
+    the same upstream reading again under each run's collection time.
+    """
+
+    def __init__(self, ttl_seconds, cacheable=None):
+        """
+        :param ttl_seconds: Seconds a response stays valid
+        :param cacheable: Predicate on a fetched value; values it rejects are
+            returned but not cached
+        """
+        self.ttl_seconds = ttl_seconds
+        self.cacheable = cacheable
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Return the cached value for ``key`` or call ``fetch`` to produce it.
+
+        :param key: Hashable cache key
+        :param fetch: Zero-argument callable returning the value
+        :return: Cached or freshly fetched value
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.hits += 1
+                    return entry[1]
+                event = self._in_flight.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self._in_flight[key] = threading.Event()
+                    break
+            # Another thread is fetching this key; re-check once it finishes
+            event.wait()
+
+        try:
+            value = fetch()
+            if self.cacheable is None or self.cacheable(value):
+                with self._lock:
+                    self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            event.set()
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,331 @@
+import os
+import signal
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import numpy as np
+from sklearn.metrics import mean_squared_error, mean_absolute_error
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.stattools import adfuller, kpss
+
+DEFAULT_FIT_TIMEOUT = 60
+DEFAULT_MAXITER = 50
+
+# Train/test split shared with every candidate fit of a worker process
+_train = None
+_test = None
+
+
+class FitTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise FitTimeout("fit exceeded time limit")
+
+
+def _init_worker(train, test):
+    global _train, _test
+    warnings.filterwarnings("ignore")
+    _train = train
+    _test = test
+
+
+@contextmanager
+def _time_limit(seconds):
+    # SIGALRM interrupts the optimizer inside the worker process itself
+    use_alarm = seconds and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+def fit_candidate(order, fit_timeout=DEFAULT_FIT_TIMEOUT, maxiter=DEFAULT_MAXITER):
+    """
+    Fit one ARIMA order on the worker's train split and score it on the test split.
+
+    Args:
+        order (tuple): ARIMA order (p,d,q)
+        fit_timeout (float, optional): Seconds before the fit is abandoned
+        maxiter (int, optional): Maximum optimizer iterations
+
+    Returns:
+        dict: Order, fitted model, predictions, metrics and fit time, or the error
+    """
+    result = {'order': order, 'error': None}
+    start_time = time.time()
+
+    try:
+        with _time_limit(fit_timeout):
+            model = ARIMA(_train, order=order)
+            model_fit = model.fit(method_kwargs={'maxiter': maxiter})
+
+        # Fail fast rather than scoring a fit that did not converge
+        if not model_fit.mle_retvals.get('converged', True):
+            raise ValueError("optimizer did not converge")
+
+        predictions = model_fit.forecast(steps=len(_test))
+
+        result.update({
+            'model': model_fit,
+            'predictions': predictions,
+            'rmse': np.sqrt(mean_squared_error(_test, predictions)),
+            'mae': mean_absolute_error(_test, predictions)
+        })
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+
+    result['fit_time'] = time.time() - start_time
+    return result
+
+
+def parallel_grid_search(train, test, orders, n_jobs=None, fit_timeout=DEFAULT_FIT_TIMEOUT):
+    """
+    Fit candidate ARIMA orders across a process pool.
+
+    Args:
+        train (pandas.Series): Training split
+        test (pandas.Series): Test split used to score each candidate
+        orders (list): Candidate (p,d,q) orders
+        n_jobs (int, optional): Worker processes, defaults to the CPU count
+        fit_timeout (float, optional): Per-fit time limit in seconds
+
+    Yields:
+        dict: Result of fit_candidate for each order, in completion order
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    # Run in-process when parallelism would only add pool overhead
+    if n_jobs == 1 or len(orders) <= 1:
+        _init_worker(train, test)
+        for order in orders:
+            yield fit_candidate(order, fit_timeout)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=min(n_jobs, len(orders)),
+        initializer=_init_worker,
+        initargs=(train, test)
+    ) as executor:
+        futures = [executor.submit(fit_candidate, order, fit_timeout) for order in orders]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def select_differencing(series, max_d=2, alpha=0.05):
+    """
+    Choose the differencing order d with unit-root tests.
+
+    The series is differenced until the KPSS test no longer rejects
+    stationarity. When KPSS rejects but ADF also rejects a unit root the
+    tests disagree, and the series is treated as stationary to avoid
+    over-differencing.
+
+    Args:
+        series (pandas.Series): Training series
+        max_d (int, optional): Largest differencing order considered
+        alpha (float, optional): Significance level of both tests
+
+    Returns:
+        int: Selected differencing order
+    """
+    y = np.asarray(series, dtype=float)
+    y = y[~np.isnan(y)]
+
+    for d in range(max_d):
+        # Too short or constant to test meaningfully
+        if len(y) < 10 or np.ptp(y) == 0:
+            return d
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                kpss_pvalue = kpss(y, regression='c', nlags='auto')[1]
+                if kpss_pvalue >= alpha:
+                    return d
+                adf_pvalue = adfuller(y, autolag='AIC')[1]
+                if adf_pvalue < alpha:
+                    return d
+        except Exception as e:
+            print(f"Unit-root test failed at d={d}: {e}")
+            return d
+        y = np.diff(y)
+
+    return max_d
+
+
+def _warm_start_params(model, previous_params):
+    # Reuse neighbouring estimates for parameters both orders share
+    if not previous_params:
+        return None
+    start_params = np.array(model.start_params, dtype=float)
+    for i, name in enumerate(model.param_names):
+        if name in previous_params:
+            start_params[i] = previous_params[name]
+    return start_params
+
+
+def fit_information_criterion(order, seasonal_order=(0, 0, 0, 0), previous_params=None,
+                              fit_timeout=DEFAULT_FIT_TIMEOUT, maxiter=DEFAULT_MAXITER):
+    """
+    Fit one (seasonal) ARIMA order on the worker's train split and report AIC/BIC.
+
+    Args:
+        order (tuple): ARIMA order (p,d,q)
+        seasonal_order (tuple, optional): Seasonal order (P,D,Q,m)
+        previous_params (dict, optional): Parameter estimates of a neighbouring
+            order, used as starting values for matching parameter names
+        fit_timeout (float, optional): Seconds before the fit is abandoned
+        maxiter (int, optional): Maximum optimizer iterations
+
+    Returns:
+        dict: Orders, fitted model, information criteria, parameters and fit time, or the error
+    """
+    result = {'order': order, 'seasonal_order': seasonal_order, 'error': None}
+    start_time = time.time()
+
+    try:
+        with _time_limit(fit_timeout):
+            model = ARIMA(_train, order=order, seasonal_order=seasonal_order)
+            # fit() writes its own settings into method_kwargs, so every
+            # call gets a fresh dict; reusing one breaks the cold refit
+            try:
+                model_fit = model.fit(
+                    start_params=_warm_start_params(model, previous_params),
+                    method_kwargs={'maxiter': maxiter}
+                )
+            except ValueError:
+                # Borrowed values can be non-stationary for this order
+                model_fit = model.fit(method_kwargs={'maxiter': maxiter})
+
+        if not model_fit.mle_retvals.get('converged', True):
+            raise ValueError("optimizer did not converge")
+
+        result.update({
+            'model': model_fit,
+            'aic': model_fit.aic,
+            'bic': model_fit.bic,
+            'params': dict(zip(model_fit.model.param_names, np.asarray(model_fit.params)))
+        })
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+
+    result['fit_time'] = time.time() - start_time
+    return result
+
+
+def _neighbours(order, seasonal_order, max_p, max_q, max_P, max_Q):
+    p, d, q = order
+    P, D, Q, m = seasonal_order
+    candidates = []
+    for dp, dq in [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1)]:
+        candidates.append(((p + dp, d, q + dq), seasonal_order))
+    if m > 1:
+        for dP, dQ in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            candidates.append((order, (P + dP, D, Q + dQ, m)))
+
+    return [
+        (o, so) for o, so in candidates
+        if 0 <= o[0] <= max_p and 0 <= o[2] <= max_q
+        and 0 <= so[0] <= max_P and 0 <= so[2] <= max_Q
+    ]
+
+
+def stepwise_search(train, d, max_p=5, max_q=5, seasonal_period=0, D=0, max_P=2, max_Q=2,
+                    criterion='aic', max_fits=60, n_jobs=None, fit_timeout=DEFAULT_FIT_TIMEOUT):
+    """
+    Stepwise (Hyndman-Khandakar style) order search driven by an information criterion.
+
+    Starting from a few small models, each round fits the neighbours of the
+    current best order (p/q and seasonal P/Q moved by one), warm-started
+    from the best model's parameters. The search stops as soon as a round
+    brings no improvement or max_fits is reached, so only a small part of
+    the (p,d,q)(P,D,Q) space is fitted.
+
+    Args:
+        train (pandas.Series): Training series
+        d (int): Differencing order, e.g. from select_differencing
+        max_p (int, optional): Largest AR order
+        max_q (int, optional): Largest MA order
+        seasonal_period (int, optional): Season length m, 0 for a non-seasonal search
+        D (int, optional): Seasonal differencing order
+        max_P (int, optional): Largest seasonal AR order
+        max_Q (int, optional): Largest seasonal MA order
+        criterion (str, optional): 'aic' or 'bic'
+        max_fits (int, optional): Upper bound on the number of fitted candidates
+        n_jobs (int, optional): Worker processes, defaults to the CPU count
+        fit_timeout (float, optional): Per-fit time limit in seconds
+
+    Yields:
+        dict: Result of fit_information_criterion for every fitted candidate
+    """
+    if criterion not in ('aic', 'bic'):
+        raise ValueError(f"Unsupported criterion: {criterion}")
+
+    if seasonal_period > 1:
+        no_season = (0, D, 0, seasonal_period)
+        initial = [
+            ((2, d, 2), (1, D, 1, seasonal_period)),
+            ((0, d, 0), no_season),
+            ((1, d, 0), (1, D, 0, seasonal_period)),
+            ((0, d, 1), (0, D, 1, seasonal_period))
+        ]
+    else:
+        max_P = max_Q = 0
+        no_season = (0, 0, 0, 0)
+        initial = [((2, d, 2), no_season), ((0, d, 0), no_season),
+                   ((1, d, 0), no_season), ((0, d, 1), no_season)]
+
+    initial = [(o, so) for o, so in initial if o[0] <= max_p and o[2] <= max_q]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    executor = None
+    if n_jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                       initargs=(train, None))
+    else:
+        _init_worker(train, None)
+
+    visited = set()
+    best = None
+    fits = 0
+    try:
+        candidates = initial
+        while candidates and fits < max_fits:
+            candidates = [c for c in candidates if c not in visited][:max_fits - fits]
+            visited.update(candidates)
+            fits += len(candidates)
+            previous_params = best['params'] if best else None
+
+            if executor is None:
+                results = [fit_information_criterion(o, so, previous_params, fit_timeout)
+                           for o, so in candidates]
+            else:
+                futures = [executor.submit(fit_information_criterion, o, so, previous_params, fit_timeout)
+                           for o, so in candidates]
+                results = [future.result() for future in futures]
+
+            improved = False
+            for result in results:
+                yield result
+                if result['error']:
+                    continue
+                if best is None or result[criterion] < best[criterion]:
+                    best = result
+                    improved = True
+
+            # Early stopping: no neighbour beat the current best
+            if not improved or best is None:
+                break
+            candidates = _neighbours(best['order'], best['seasonal_order'],
+                                     max_p, max_q, max_P, max_Q)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
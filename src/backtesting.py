@@ -0,0 +1,317 @@
+import argparse
+import contextlib
+import copy
+import itertools
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+
+from arima_search import DEFAULT_FIT_TIMEOUT, DEFAULT_MAXITER, _time_limit
+from batch_forecaster import BatchForecaster
+from compact_model import CompactARIMA
+
+# Steps ahead the prediction service is asked for most often
+DEFAULT_HORIZONS = (1, 6, 24)
+DEFAULT_ALPHA = 0.05
+DEFAULT_ORDERS = list(itertools.product(range(0, 3), range(0, 2), range(0, 3)))
+
+# Series shared with every fold of a worker process
+_series = None
+
+
+def _init_worker(series):
+    global _series
+    warnings.filterwarnings("ignore")
+    _series = np.asarray(series, dtype=float)
+
+
+def plan_folds(n, initial, refit_every=None):
+    """
+    Split the forecast origins initial..n-1 into folds.
+
+    Each fold is fitted once on the observations before it; the origins
+    inside the fold are reached by filtering the fold's observations with
+    the fitted parameters, not by refitting.
+
+    Args:
+        n (int): Length of the series
+        initial (int): First forecast origin, i.e. the size of the first training window
+        refit_every (int, optional): Origins per fold, None for a single fit
+
+    Returns:
+        list: (fit_end, start, end) tuples; the model is fitted on series[:fit_end]
+            and forecasts from the origins start..end-1
+    """
+    if not 0 < initial < n:
+        raise ValueError(f"Initial window {initial} must lie inside the series of length {n}")
+    if not refit_every:
+        return [(initial, initial, n)]
+    return [(start, start, min(start + refit_every, n)) for start in range(initial, n, refit_every)]
+
+
+def backtest_fold(order, fit_end, start, end, horizons=DEFAULT_HORIZONS, alpha=DEFAULT_ALPHA,
+                  fit_timeout=DEFAULT_FIT_TIMEOUT, maxiter=DEFAULT_MAXITER):
+    """
+    Score one ARIMA order on one fold of the worker's series.
+
+    The order is fitted once on series[:fit_end]. The fitted results are
+    then extended over the fold, which runs the Kalman filter with fixed
+    parameters and yields the predicted state at every origin; forecasts
+    from all origins are computed in one BatchForecaster pass.
+
+    Args:
+        order (tuple): ARIMA order (p,d,q)
+        fit_end (int): Observations used for the fit
+        start (int): First forecast origin of the fold
+        end (int): End (exclusive) of the fold's forecast origins
+        horizons (tuple, optional): Steps ahead to score
+        alpha (float, optional): Significance level of the scored prediction intervals
+        fit_timeout (float, optional): Seconds before the fit is abandoned
+        maxiter (int, optional): Maximum optimizer iterations
+
+    Returns:
+        dict: Order, fold bounds, per-horizon error sums and fit time, or the error
+    """
+    result = {'order': order, 'fold_start': start, 'fold_end': end, 'error': None}
+    start_time = time.time()
+
+    try:
+        with _time_limit(fit_timeout):
+            model_fit = ARIMA(_series[:fit_end], order=order).fit(method_kwargs={'maxiter': maxiter})
+
+        if not model_fit.mle_retvals.get('converged', True):
+            raise ValueError("optimizer did not converge")
+
+        # Column i holds the state predicted for time fit_end + i, i.e. the
+        # state a forecast issued at that origin starts from
+        filter_results = model_fit.extend(_series[fit_end:end]).filter_results
+        template = CompactARIMA.from_results(model_fit, order)
+        models = []
+        for origin in range(start, end):
+            model = copy.copy(template)
+            model.state = filter_results.predicted_state[:, origin - fit_end]
+            model.state_cov_matrix = filter_results.predicted_state_cov[:, :, origin - fit_end]
+            models.append(model)
+
+        mean, variance = BatchForecaster(models).forecast(max(horizons))
+        z = NormalDist().inv_cdf(1 - alpha / 2)
+        origins = np.arange(start, end)
+
+        metrics = {}
+        for horizon in horizons:
+            # Forecasts whose target lies beyond the series cannot be scored
+            targets = origins + horizon - 1
+            valid = targets < len(_series)
+            errors = _series[targets[valid]] - mean[valid, horizon - 1]
+            se = np.sqrt(variance[valid, horizon - 1])
+            metrics[horizon] = {
+                'count': int(valid.sum()),
+                'abs_error': float(np.abs(errors).sum()),
+                'squared_error': float((errors ** 2).sum()),
+                'covered': int((np.abs(errors) <= z * se).sum())
+            }
+        result['metrics'] = metrics
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+
+    result['fit_time'] = time.time() - start_time
+    return result
+
+
+def summarize_folds(results, horizons=DEFAULT_HORIZONS):
+    """
+    Aggregate fold results into one row per order and horizon.
+
+    Args:
+        results (list): Results of backtest_fold
+        horizons (tuple, optional): Scored horizons
+
+    Returns:
+        pandas.DataFrame: order, horizon, count, mae, rmse, coverage, fit_time
+            and failed_folds, sorted by horizon and rmse
+    """
+    totals = {}
+    for result in results:
+        order = tuple(result['order'])
+        entry = totals.setdefault(order, {
+            'fit_time': 0.0, 'failed_folds': 0,
+            'sums': {h: {'count': 0, 'abs_error': 0.0, 'squared_error': 0.0, 'covered': 0} for h in horizons}
+        })
+        entry['fit_time'] += result['fit_time']
+        if result['error']:
+            entry['failed_folds'] += 1
+            continue
+        for horizon, sums in result['metrics'].items():
+            for key, value in sums.items():
+                entry['sums'][horizon][key] += value
+
+    rows = []
+    for order, entry in totals.items():
+        for horizon, sums in entry['sums'].items():
+            count = sums['count']
+            rows.append({
+                'order': str(order),
+                'horizon': horizon,
+                'count': count,
+                'mae': sums['abs_error'] / count if count else np.nan,
+                'rmse': np.sqrt(sums['squared_error'] / count) if count else np.nan,
+                'coverage': sums['covered'] / count if count else np.nan,
+                'fit_time': entry['fit_time'],
+                'failed_folds': entry['failed_folds']
+            })
+
+    table = pd.DataFrame(rows, columns=['order', 'horizon', 'count', 'mae', 'rmse', 'coverage',
+                                        'fit_time', 'failed_folds'])
+    return table.sort_values(['horizon', 'rmse'], kind='stable').reset_index(drop=True)
+
+
+def backtest_orders(series, orders=DEFAULT_ORDERS, initial=None, horizons=DEFAULT_HORIZONS,
+                    refit_every=None, alpha=DEFAULT_ALPHA, n_jobs=None, fit_timeout=DEFAULT_FIT_TIMEOUT):
+    """
+    Rolling-origin (walk-forward) evaluation of candidate ARIMA orders.
+
+    Every (order, fold) pair is an independent task on a process pool.
+    Failed fits are reported per fold and counted in the summary instead of
+    aborting the backtest.
+
+    Args:
+        series (pandas.Series): Series to backtest on
+        orders (list, optional): Candidate (p,d,q) orders
+        initial (int, optional): First forecast origin, defaults to 80% of the series
+        horizons (tuple, optional): Steps ahead to score
+        refit_every (int, optional): Origins between refits, None to fit each order once
+        alpha (float, optional): Significance level of the scored prediction intervals
+        n_jobs (int, optional): Worker processes, defaults to the CPU count
+        fit_timeout (float, optional): Per-fit time limit in seconds
+
+    Returns:
+        pandas.DataFrame: Summary of summarize_folds
+    """
+    initial = initial or int(len(series) * 0.8)
+    folds = plan_folds(len(series), initial, refit_every)
+    tasks = [(order, *fold) for order in orders for fold in folds]
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    results = []
+    if n_jobs == 1 or len(tasks) <= 1:
+        _init_worker(series)
+        for task in tasks:
+            results.append(backtest_fold(*task, horizons, alpha, fit_timeout))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(n_jobs, len(tasks)),
+            initializer=_init_worker,
+            initargs=(np.asarray(series, dtype=float),)
+        ) as executor:
+            futures = [executor.submit(backtest_fold, *task, horizons, alpha, fit_timeout) for task in tasks]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    for result in results:
+        if result['error']:
+            print(f"Error with parameters {result['order']} on fold "
+                  f"{result['fold_start']}-{result['fold_end']}: {result['error']}")
+
+    return summarize_folds(results, horizons)
+
+
+def ranked_orders(table, horizon=None):
+    """
+    Scored orders from lowest to highest RMSE at ``horizon``, by default the shortest scored horizon.
+
+    Returns:
+        list: (p,d,q) orders
+    """
+    horizon = horizon or table['horizon'].min()
+    scored = table[(table['horizon'] == horizon) & (table['count'] > 0)]
+    return [tuple(int(x) for x in order.strip('()').split(','))
+            for order in scored.sort_values('rmse', kind='stable')['order']]
+
+
+def best_order(table, horizon=None):
+    """
+    Order with the lowest RMSE at ``horizon``, by default the shortest scored horizon.
+
+    Returns:
+        tuple: Best (p,d,q) order, or None if no order could be scored
+    """
+    ranked = ranked_orders(table, horizon)
+    return ranked[0] if ranked else None
+
+
+def log_backtest(table, params=None, selected=None):
+    """
+    Log a backtest to MLflow as a single run.
+
+    The per-order table is stored as one CSV artifact and only the selected
+    order's per-horizon metrics are logged as metrics, so the cost does not
+    grow with the number of orders or folds. Logs into the active run if
+    there is one.
+
+    Args:
+        table (pandas.DataFrame): Summary from backtest_orders
+        params (dict, optional): Backtest settings to log as parameters
+        selected (tuple, optional): Order whose metrics are logged, defaults to best_order
+
+    Returns:
+        tuple: The selected order
+    """
+    import mlflow
+
+    selected = selected or best_order(table)
+    run = contextlib.nullcontext() if mlflow.active_run() else mlflow.start_run(run_name="ARIMA_Backtest")
+    with run:
+        mlflow.log_params({**(params or {}), 'best_arima_order': selected})
+        if selected is not None:
+            rows = table[table['order'] == str(selected)]
+            metrics = {}
+            for row in rows.itertuples():
+                metrics[f'mae_h{row.horizon}'] = row.mae
+                metrics[f'rmse_h{row.horizon}'] = row.rmse
+                metrics[f'coverage_h{row.horizon}'] = row.coverage
+            mlflow.log_metrics({key: float(value) for key, value in metrics.items() if pd.notna(value)})
+        mlflow.log_text(table.to_csv(index=False), 'backtest_results.csv')
+    return selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of ARIMA orders on the AQI series")
+    parser.add_argument('--horizons', type=int, nargs='+', default=list(DEFAULT_HORIZONS))
+    parser.add_argument('--initial', type=int, default=None,
+                        help="first forecast origin, defaults to 80%% of the series")
+    parser.add_argument('--refit-every', type=int, default=None,
+                        help="origins between refits; by default each order is fitted once")
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA)
+    parser.add_argument('--n-jobs', type=int, default=None)
+    parser.add_argument('--fit-timeout', type=float, default=DEFAULT_FIT_TIMEOUT)
+    parser.add_argument('--no-mlflow', action='store_true')
+    args = parser.parse_args()
+
+    from model_training import load_training_series
+
+    series, _, _ = load_training_series()
+    table = backtest_orders(series, DEFAULT_ORDERS, args.initial, tuple(args.horizons), args.refit_every,
+                            args.alpha, args.n_jobs, args.fit_timeout)
+    print(table.to_string(index=False))
+
+    selected = best_order(table)
+    print(f"Best ARIMA order at horizon {min(args.horizons)}: {selected}")
+    if not args.no_mlflow:
+        import mlflow
+        mlflow.set_experiment('aqi_prediction')
+        log_backtest(table, {
+            'horizons': args.horizons,
+            'initial': args.initial or int(len(series) * 0.8),
+            'refit_every': args.refit_every,
+            'alpha': args.alpha
+        }, selected)
+
+
+if __name__ == '__main__':
+    main()
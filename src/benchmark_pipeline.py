@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from synthetic_data import generate_environmental_data, make_cities, write_csv_files
+
+STAGES = ('load', 'preprocess', 'train', 'serve', 'collect')
+DEFAULT_OUTPUT_DIR = '../benchmarks'
+
+# Canned upstream responses in the shape the collector parses
+STUB_RESPONSES = {
+    'weather': {'main': {'temp': 21.5, 'humidity': 48}, 'wind': {'speed': 3.2}},
+    'air_pollution': {'list': [{'main': {'aqi': 3}, 'components': {
+        'co': 420.6, 'no': 4.1, 'no2': 22.3, 'o3': 61.0, 'so2': 9.5, 'pm2_5': 41.2, 'pm10': 77.8}}]},
+    'nearest_city': {'status': 'success', 'data': {'current': {'pollution': {'aqius': 96, 'mainus': 'p2'}}}}
+}
+
+
+def git_commit():
+    """
+    Commit the benchmark ran against, with a suffix when the tree is dirty.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def best_of(function, repeat=1):
+    """
+    Run ``function`` ``repeat`` times.
+
+    :return: Tuple of (fastest wall time in seconds, result of the last call)
+    """
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), result
+
+
+def latency_summary(latencies):
+    latencies = np.asarray(latencies)
+    return {
+        'count': int(len(latencies)),
+        'mean_ms': float(latencies.mean() * 1e3),
+        'p50_ms': float(np.percentile(latencies, 50) * 1e3),
+        'p95_ms': float(np.percentile(latencies, 95) * 1e3),
+        'p99_ms': float(np.percentile(latencies, 99) * 1e3),
+        'max_ms': float(latencies.max() * 1e3)
+    }
+
+
+class StubUpstream:
+    """
+    Local HTTP server answering the OpenWeatherMap and AirVisual endpoints.
+
+    Every response is delayed by ``latency`` seconds to stand in for the
+    network round trip.
+    """
+
+    def __init__(self, latency=0.02):
+        responses = {name: json.dumps(body).encode() for name, body in STUB_RESPONSES.items()}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                body = responses.get(self.path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1])
+                time.sleep(latency)
+                self.send_response(200 if body else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body or b'')))
+                self.end_headers()
+                self.wfile.write(body or b'')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def bench_load(raw_dir, workdir, repeat):
+    from data_preprocessing import DataLoader
+
+    cold_seconds, df = best_of(lambda: DataLoader.load_all_csv_files(raw_dir), repeat)
+    cache_dir = os.path.join(workdir, 'cache')
+    build_seconds, _ = best_of(lambda: DataLoader.load_all_csv_files(raw_dir, cache_dir=cache_dir))
+    cached_seconds, _ = best_of(lambda: DataLoader.load_all_csv_files(raw_dir, cache_dir=cache_dir), repeat)
+    return {
+        'rows': int(len(df)),
+        'files': len([name for name in os.listdir(raw_dir) if name.endswith('.csv')]),
+        'seconds': cold_seconds,
+        'cache_build_seconds': build_seconds,
+        'cached_seconds': cached_seconds,
+        'rows_per_second': len(df) / cold_seconds
+    }, df
+
+
+def bench_preprocess(df, repeat):
+    from data_preprocessing import preprocess_data
+
+    seconds, processed = best_of(lambda: preprocess_data(df), repeat)
+    return {
+        'rows_in': int(len(df)),
+        'rows_out': int(len(processed)),
+        'seconds': seconds,
+        'rows_per_second': len(df) / seconds
+    }, processed
+
+
+def bench_train(processed, workdir, train_rows, n_jobs):
+    import mlflow
+    from model_training import save_best_model, train_arima_model
+
+    # Keep benchmark runs and their artifacts out of the project's tracking store
+    mlflow.set_tracking_uri(f"sqlite:///{os.path.join(workdir, 'mlflow.db')}")
+    mlflow.create_experiment('pipeline_benchmark', artifact_location=os.path.join(workdir, 'artifacts'))
+    mlflow.set_experiment('pipeline_benchmark')
+
+    series = processed['aqi'].tail(train_rows).reset_index(drop=True)
+    seconds, (model, _, _, order) = best_of(lambda: train_arima_model(series, n_jobs=n_jobs))
+
+    model_path = os.path.join(workdir, 'models', 'model.pkl')
+    save_best_model(model, order, model_path, metadata={
+        'trained_at': time.time(),
+        'last_timestamp': str(processed['timestamp'].max())
+    })
+    return {
+        'rows': int(len(series)),
+        'n_jobs': n_jobs or os.cpu_count(),
+        'seconds': seconds,
+        'order': list(order)
+    }, model_path
+
+
+def bench_serve(model_path, workdir, cities, requests_count):
+    import prediction_service as service
+    from accuracy_tracker import PredictionLog
+    from model_registry import ModelRegistry
+    from model_store import FleetRegistry, ModelStore
+
+    # Serve the freshly trained model; nothing from the project's models/ directory
+    service.registry = ModelRegistry(f"{os.path.splitext(model_path)[0]}.npz")
+    service.registry.add_listener(service.forecast_cache.refresh)
+    service.fleet = FleetRegistry(ModelStore(os.path.join(workdir, 'fleet')))
+    service.prediction_log = PredictionLog(os.path.join(workdir, 'accuracy', 'predictions.bin'))
+    client = service.app.test_client()
+
+    first_seconds, response = best_of(lambda: client.post('/prediction', json={'steps': 1}))
+    if response.status_code != 200:
+        raise RuntimeError(f"/prediction returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    latencies = []
+    errors = 0
+    start_time = time.perf_counter()
+    for index in range(requests_count):
+        payload = {'city': cities[index % len(cities)]['name'], 'steps': 1 + index % 24}
+        request_start = time.perf_counter()
+        response = client.post('/prediction', json=payload)
+        latencies.append(time.perf_counter() - request_start)
+        errors += response.status_code != 200
+    total_seconds = time.perf_counter() - start_time
+
+    return {
+        'first_request_seconds': first_seconds,
+        'requests': requests_count,
+        'errors': errors,
+        'requests_per_second': requests_count / total_seconds,
+        'latency': latency_summary(latencies)
+    }
+
+
+def bench_collect(workdir, cities, upstream_latency, max_workers):
+    from accuracy_tracker import AccuracyTracker, PredictionLog
+    from api_client import TokenBucket
+    from data_collection import EnvironmentalDataCollector
+
+    with StubUpstream(upstream_latency) as upstream:
+        collector = EnvironmentalDataCollector(
+            storage_backend='csv', max_workers=max_workers,
+            openweather_base_url=f"{upstream.url}/data/2.5",
+            airvisual_base_url=f"{upstream.url}/v2"
+        )
+        collector.data_dir = os.path.join(workdir, 'collected')
+        os.makedirs(collector.data_dir, exist_ok=True)
+        # The stub has no quota; the real limits would dominate the timing
+        collector.rate_limiters = {name: TokenBucket(1e9) for name in collector.rate_limiters}
+        collector.accuracy_tracker = AccuracyTracker(
+            PredictionLog(os.path.join(workdir, 'accuracy', 'predictions.bin')),
+            os.path.join(workdir, 'accuracy', 'state.json')
+        )
+
+        seconds, filename = best_of(lambda: collector.collect_data(cities))
+
+    return {
+        'cities': len(cities),
+        'requests': 3 * len(cities),
+        'upstream_latency_ms': upstream_latency * 1e3,
+        'max_workers': max_workers,
+        'seconds': seconds,
+        'cities_per_second': len(cities) / seconds,
+        'written': filename is not None
+    }
+
+
+def run_benchmark(args, workdir):
+    results = {}
+    # Serving needs a trained model and training needs cleaned data
+    stages = set(args.stages)
+    if 'serve' in stages:
+        stages.add('train')
+    if 'train' in stages:
+        stages.add('preprocess')
+
+    def record(stage, function):
+        # A failing stage is reported and later stages that need its output are skipped
+        if stage not in stages:
+            return None
+        print(f"Running {stage}...")
+        try:
+            metrics, output = function()
+        except Exception as e:
+            print(f"Stage {stage} failed: {e}")
+            results[stage] = {'error': str(e)}
+            return None
+        results[stage] = metrics
+        print(f"  {json.dumps(metrics)}")
+        return output
+
+    seconds, df = best_of(lambda: generate_environmental_data(
+        args.cities, args.days, args.samples_per_day, seed=args.seed))
+    raw_dir = os.path.join(workdir, 'raw')
+    write_seconds, files = best_of(lambda: write_csv_files(df, raw_dir, args.runs_per_file))
+    results['generate'] = {'rows': int(len(df)), 'files': files, 'seconds': seconds,
+                           'write_seconds': write_seconds}
+
+    loaded = record('load', lambda: bench_load(raw_dir, workdir, args.repeat))
+    processed = record('preprocess', lambda: bench_preprocess(df if loaded is None else loaded, args.repeat))
+    model_path = None
+    if processed is not None:
+        model_path = record('train', lambda: bench_train(processed, workdir, args.train_rows, args.n_jobs))
+    cities = make_cities(args.cities, args.seed)
+    if model_path is not None:
+        record('serve', lambda: (bench_serve(model_path, workdir, cities, args.requests), None))
+    record('collect', lambda: (bench_collect(workdir, cities, args.upstream_latency_ms / 1e3,
+                                             args.max_workers), None))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the load -> preprocess -> train -> serve pipeline")
+    parser.add_argument('--cities', type=int, default=20)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--samples-per-day', type=int, default=24)
+    parser.add_argument('--runs-per-file', type=int, default=1,
+                        help="collection runs per CSV file; 1 mirrors the collector")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--train-rows', type=int, default=2000,
+                        help="most recent rows of the cleaned series used for training")
+    parser.add_argument('--n-jobs', type=int, default=None)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--upstream-latency-ms', type=float, default=20.0)
+    parser.add_argument('--max-workers', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help=f"results file, defaults to {DEFAULT_OUTPUT_DIR}/pipeline_<commit>.json")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    with tempfile.TemporaryDirectory(prefix='pipeline_benchmark_') as workdir:
+        results = run_benchmark(args, workdir)
+
+    report = {
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': vars(args),
+        'results': results
+    }
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"pipeline_{(commit or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_preprocessing import FEATURES, TARGET, preprocess_data
+
+
+def legacy_preprocess_data(df):
+    """
+    Column-by-column implementation preprocess_data replaced, kept for comparison.
+    """
+    df_processed = df.copy()
+
+    for column in FEATURES + [TARGET]:
+        df_processed[column] = df_processed[column].fillna(df_processed[column].median())
+
+    for column in FEATURES + [TARGET]:
+        Q1 = df_processed[column].quantile(0.25)
+        Q3 = df_processed[column].quantile(0.75)
+        IQR = Q3 - Q1
+
+        lower_bound = Q1 - 1.5 * IQR
+        upper_bound = Q3 + 1.5 * IQR
+
+        df_processed = df_processed[
+            (df_processed[column] >= lower_bound) &
+            (df_processed[column] <= upper_bound)
+        ]
+
+    return df_processed
+
+
+def make_frame(rows, missing_fraction=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {column: rng.lognormal(mean=2.0, sigma=0.5, size=rows) for column in FEATURES + [TARGET]}
+    df = pd.DataFrame(data)
+    df['city'] = rng.choice(['Lahore', 'Karachi', 'Islamabad'], size=rows)
+
+    # Sprinkle missing values so imputation does real work
+    for column in FEATURES + [TARGET]:
+        df.loc[rng.random(rows) < missing_fraction, column] = np.nan
+
+    return df
+
+
+def time_call(function, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function(df)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy and vectorised preprocessing")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+
+    legacy_seconds, legacy_rows = time_call(legacy_preprocess_data, df, args.repeat)
+    vectorised_seconds, vectorised_rows = time_call(preprocess_data, df, args.repeat)
+
+    print(f"Rows: {args.rows}")
+    print(f"Legacy:     {legacy_seconds:.3f}s ({legacy_rows} rows kept)")
+    print(f"Vectorised: {vectorised_seconds:.3f}s ({vectorised_rows} rows kept)")
+    print(f"Speedup:    {legacy_seconds / vectorised_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
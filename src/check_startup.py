@@ -0,0 +1,97 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Import-time budget for `import prediction_service`, in seconds
+IMPORT_BUDGET_SECONDS = 0.5
+
+# Modules that must only be imported once a model is loaded
+DEFERRED_MODULES = ('numpy', 'pandas', 'statsmodels', 'joblib', 'sklearn', 'mlflow')
+
+
+def measure_import_time(module='prediction_service'):
+    """
+    Import ``module`` in a fresh interpreter with -X importtime.
+
+    :return: Tuple of (cumulative import seconds, set of imported top-level packages)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+
+    cumulative_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = [field.strip() for field in line[len('import time:'):].split('|')]
+        if not fields[1].isdigit():
+            continue
+        name = fields[2].strip()
+        imported.add(name.split('.')[0])
+        if name == module:
+            cumulative_us = int(fields[1])
+
+    return cumulative_us / 1e6, imported
+
+
+def measure_first_prediction(port=8000, timeout=60.0):
+    """
+    Start the service and time until /prediction first succeeds.
+
+    :return: Seconds from process start to the first 200 response
+    """
+    start_time = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'prediction_service.py'], cwd=SRC_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        session = requests.Session()
+        while time.perf_counter() - start_time < timeout:
+            try:
+                response = session.post(f'http://localhost:{port}/prediction', timeout=1)
+                if response.status_code == 200:
+                    return time.perf_counter() - start_time
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.05)
+        raise TimeoutError(f"No successful prediction within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check prediction_service cold-start budget")
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_SECONDS)
+    parser.add_argument('--first-prediction', action='store_true',
+                        help="also start the service and time the first successful prediction")
+    args = parser.parse_args()
+
+    import_seconds, imported = measure_import_time()
+    print(f"import prediction_service: {import_seconds:.3f}s (budget {args.budget:.3f}s)")
+
+    failures = []
+    if import_seconds > args.budget:
+        failures.append(f"import time {import_seconds:.3f}s exceeds budget {args.budget:.3f}s")
+    eager = sorted(imported.intersection(DEFERRED_MODULES))
+    if eager:
+        failures.append(f"heavy modules imported eagerly: {', '.join(eager)}")
+
+    if args.first_prediction:
+        print(f"time to first prediction: {measure_first_prediction():.3f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
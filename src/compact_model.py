@@ -0,0 +1,149 @@
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def _time_invariant(matrix):
+    # statsmodels keeps a trailing time axis; forecasting uses its last slice
+    matrix = np.asarray(matrix, dtype=float)
+    return matrix[..., -1] if matrix.ndim == 3 else matrix
+
+
+def compact_arrays(results, order, metadata=None):
+    """
+    Arrays of the forecast-only representation of a fitted ARIMA results object.
+
+    Covers the order, fitted parameters, the state-space system matrices,
+    the one-step-ahead predicted state and its covariance at the end of the
+    sample, and the residual variance. The trailing intercepts are reused
+    for every forecast step, which covers constant trends but not exogenous
+    regressors or time trends.
+
+    :param results: Fitted statsmodels ARIMA results
+    :param order: ARIMA order (p,d,q)
+    :param metadata: Extra scalar entries (e.g. trained_at) stored with the model
+    :return: Dict of numpy arrays, as accepted by CompactARIMA
+    """
+    filter_results = results.filter_results
+    obs_intercept = np.asarray(filter_results.obs_intercept, dtype=float)
+    state_intercept = np.asarray(filter_results.state_intercept, dtype=float)
+
+    arrays = {
+        'format_version': np.array(FORMAT_VERSION),
+        'order': np.asarray(order, dtype=int),
+        'params': np.asarray(results.params, dtype=float),
+        'design': _time_invariant(filter_results.design),
+        'obs_intercept': obs_intercept[:, -1],
+        'obs_cov': _time_invariant(filter_results.obs_cov),
+        'transition': _time_invariant(filter_results.transition),
+        'state_intercept': state_intercept[:, -1],
+        'selection': _time_invariant(filter_results.selection),
+        'state_cov': _time_invariant(filter_results.state_cov),
+        'state': np.asarray(filter_results.predicted_state[:, -1], dtype=float),
+        'state_cov_matrix': np.asarray(filter_results.predicted_state_cov[:, :, -1], dtype=float),
+        'sigma2': np.array(float(np.asarray(results.params)[-1])),
+        'nobs': np.array(int(results.nobs))
+    }
+    for key, value in (metadata or {}).items():
+        if value is not None:
+            arrays[f"meta_{key}"] = np.array(value)
+    return arrays
+
+
+def export_compact(results, order, filename, metadata=None):
+    """
+    Write the minimal state needed to forecast from a fitted ARIMA results object.
+
+    Stores the arrays of compact_arrays as a small .npz file.
+
+    :param results: Fitted statsmodels ARIMA results
+    :param order: ARIMA order (p,d,q)
+    :param filename: Destination .npz path
+    :param metadata: Extra scalar entries (e.g. trained_at) stored with the model
+    :return: Path to the saved file
+    """
+    arrays = compact_arrays(results, order, metadata)
+
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    # np.savez appends .npz to names without it, so keep the suffix on the temp file
+    tmp_filename = f"{filename}.tmp.npz"
+    np.savez(tmp_filename, **arrays)
+    os.replace(tmp_filename, filename)
+    return filename
+
+
+class ForecastResult:
+    """
+    Minimal stand-in for statsmodels' PredictionResults.
+    """
+
+    def __init__(self, predicted_mean, var_pred_mean):
+        self.predicted_mean = predicted_mean
+        self.var_pred_mean = var_pred_mean
+
+    def conf_int(self, alpha=0.05):
+        z = NormalDist().inv_cdf(1 - alpha / 2)
+        se = np.sqrt(self.var_pred_mean)
+        return np.column_stack([self.predicted_mean - z * se, self.predicted_mean + z * se])
+
+
+class CompactARIMA:
+    """
+    Forecast-only ARIMA model loaded from an export_compact file.
+
+    Runs the Kalman prediction recursion from the stored end-of-sample
+    state, so forecasts match the results object's get_forecast without
+    importing statsmodels or keeping the training data.
+    """
+
+    def __init__(self, arrays):
+        self.order = tuple(int(x) for x in arrays['order'])
+        self.params = arrays['params']
+        self.design = arrays['design']
+        self.obs_intercept = arrays['obs_intercept']
+        self.obs_cov = arrays['obs_cov']
+        self.transition = arrays['transition']
+        self.state_intercept = arrays['state_intercept']
+        self.selection = arrays['selection']
+        self.state_cov = arrays['state_cov']
+        self.state = arrays['state']
+        self.state_cov_matrix = arrays['state_cov_matrix']
+        self.sigma2 = float(arrays['sigma2'])
+        self.nobs = int(arrays['nobs'])
+        self.metadata = {key[5:]: arrays[key].item() for key in arrays if key.startswith('meta_')}
+
+        # R Q R' does not change between steps
+        self._state_noise = self.selection @ self.state_cov @ self.selection.T
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename, allow_pickle=False) as data:
+            return cls({key: data[key] for key in data.files})
+
+    @classmethod
+    def from_results(cls, results, order):
+        return cls(compact_arrays(results, order))
+
+    def get_forecast(self, steps=1):
+        """
+        Mean and variance of the 1..steps ahead forecasts.
+
+        :param steps: Forecast horizon
+        :return: ForecastResult with predicted_mean and var_pred_mean arrays
+        """
+        mean = np.empty(steps)
+        variance = np.empty(steps)
+        state = self.state
+        state_cov = self.state_cov_matrix
+        for step in range(steps):
+            mean[step] = (self.design @ state)[0] + self.obs_intercept[0]
+            variance[step] = (self.design @ state_cov @ self.design.T)[0, 0] + self.obs_cov[0, 0]
+            state = self.transition @ state + self.state_intercept
+            state_cov = self.transition @ state_cov @ self.transition.T + self._state_noise
+        return ForecastResult(mean, variance)
+
+    def forecast(self, steps=1):
+        return self.get_forecast(steps).predicted_mean
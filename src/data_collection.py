@@ -1,59 +1,182 @@
 import requests
 import pandas as pd
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
 import logging
+import time
 from config import Config
+from data_preprocessing import PARQUET_DATA_DIR, RAW_DATA_DIR
+from api_client import DEFAULT_TIMEOUT, ResponseCache, TokenBucket, build_session
+from accuracy_tracker import DEFAULT_PREDICTION_LOG_PATH, DEFAULT_STATE_PATH, AccuracyTracker, PredictionLog
+from metrics import ROWS_WRITTEN, UPSTREAM_REQUEST_ERRORS, UPSTREAM_REQUEST_LATENCY, push_metrics
 
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(levelname)s: %(message)s')
 
+DEFAULT_MAX_WORKERS = 16
+
+def is_cacheable_response(data):
+    """
+    AirVisual reports errors as HTTP 200 with "status": "fail"; those are not cached.
+    """
+    return not (isinstance(data, dict) and data.get('status') == 'fail')
+
 class EnvironmentalDataCollector:
-    def __init__(self):
+    def __init__(self, storage_backend=None, max_workers=DEFAULT_MAX_WORKERS,
+                 timeout=DEFAULT_TIMEOUT, openweather_base_url=None, airvisual_base_url=None):
+        """
+        :param storage_backend: 'csv' for one CSV per run or 'parquet' to append
+            to the partitioned ParquetStore; defaults to Config.STORAGE_BACKEND
+        :param max_workers: Upper bound on concurrent upstream requests
+        :param timeout: Requests (connect, read) timeout in seconds
+        :param openweather_base_url: Override of Config.OPENWEATHER_BASE_URL, e.g. a local stub
+        :param airvisual_base_url: Override of Config.AIRVISUAL_BASE_URL, e.g. a local stub
+        """
         self.openweather_key = Config.OPENWEATHER_API_KEY
         self.airvisual_key = Config.AIRVISUAL_API_KEY
-        self.data_dir = 'data/raw'
+        self.openweather_base_url = openweather_base_url or Config.OPENWEATHER_BASE_URL
+        self.airvisual_base_url = airvisual_base_url or Config.AIRVISUAL_BASE_URL
+        # Where training and the pipeline's change check read collected CSVs
+        self.data_dir = RAW_DATA_DIR
+        self.storage_backend = storage_backend or getattr(Config, 'STORAGE_BACKEND', 'csv')
         os.makedirs(self.data_dir, exist_ok=True)
+        
+        self.store = None
+        if self.storage_backend == 'parquet':
+            from storage import ParquetStore
+            self.store = ParquetStore(getattr(Config, 'PARQUET_DATA_DIR', PARQUET_DATA_DIR))
+        
+        # One pooled session shared by all worker threads keeps connections alive per host
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = build_session(pool_size=max_workers)
+        
+        # Per-upstream quotas, and a response cache keyed by endpoint and
+        # rounded coordinates so nearby cities share one request
+        self.rate_limiters = {
+            'openweather': TokenBucket(getattr(Config, 'OPENWEATHER_RATE_PER_MINUTE', 60)),
+            'airvisual': TokenBucket(getattr(Config, 'AIRVISUAL_RATE_PER_MINUTE', 5))
+        }
+        self.coordinate_precision = {
+            'openweather': getattr(Config, 'OPENWEATHER_COORDINATE_PRECISION', 2),
+            'airvisual': getattr(Config, 'AIRVISUAL_COORDINATE_PRECISION', 1)
+        }
+        self.response_cache = ResponseCache(
+            getattr(Config, 'RESPONSE_CACHE_TTL_SECONDS', 600),
+            cacheable=is_cacheable_response
+        )
+        
+        # Served forecasts are scored against each new batch of observations
+        self.accuracy_tracker = AccuracyTracker(
+            PredictionLog(getattr(Config, 'PREDICTION_LOG_PATH', DEFAULT_PREDICTION_LOG_PATH)),
+            getattr(Config, 'ACCURACY_STATE_PATH', DEFAULT_STATE_PATH)
+        )
 
-    def fetch_openweather_data(self, city):
-        """Fetch weather and pollution data from OpenWeatherMap"""
+    def _get_json(self, upstream, url, params):
+        precision = self.coordinate_precision[upstream]
+        key = (url, round(params['lat'], precision), round(params['lon'], precision))
+        
+        # Path tail ('weather', 'air_pollution', 'nearest_city') keeps label cardinality fixed
+        endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+        
+        def fetch():
+            self.rate_limiters[upstream].acquire()
+            # Timed after the rate limiter so the histogram reflects upstream latency only
+            start_time = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException:
+                UPSTREAM_REQUEST_ERRORS.labels(upstream=upstream, endpoint=endpoint).inc()
+                raise
+            finally:
+                UPSTREAM_REQUEST_LATENCY.labels(upstream=upstream, endpoint=endpoint).observe(
+                    time.perf_counter() - start_time)
+        
+        return self.response_cache.get_or_fetch(key, fetch)
+
+    def score_predictions(self, df):
         try:
-            # Fetch current weather and air pollution data
-            weather_url = f"{Config.OPENWEATHER_BASE_URL}/weather"
-            pollution_url = f"{Config.OPENWEATHER_BASE_URL}/air_pollution"
-            
-            weather_params = {
-                'lat': city['lat'], 
-                'lon': city['lon'], 
-                'appid': self.openweather_key,
-                'units': 'metric'
-            }
-            
-            pollution_params = weather_params.copy()
-            
-            weather_response = requests.get(weather_url, params=weather_params)
-            pollution_response = requests.get(pollution_url, params=pollution_params)
-            
-            weather_data = weather_response.json()
-            pollution_data = pollution_response.json()
-            
+            scored = self.accuracy_tracker.update(df)
+            logging.info(f"Scored {scored} served predictions against new observations")
+        except Exception as e:
+            logging.error(f"Prediction scoring failed: {e}")
+
+    def log_request_stats(self):
+        cache = self.response_cache
+        logging.info(
+            f"Response cache: {cache.hits} hits, {cache.misses} misses "
+            f"(hit ratio {cache.hit_ratio():.2f})"
+        )
+        for upstream, limiter in self.rate_limiters.items():
+            logging.info(f"{upstream} throttle wait: {limiter.wait_seconds:.2f}s")
+
+    def _openweather_params(self, city):
+        return {
+            'lat': city['lat'], 
+            'lon': city['lon'], 
+            'appid': self.openweather_key,
+            'units': 'metric'
+        }
+
+    def fetch_openweather_weather(self, city):
+        return self._get_json('openweather', f"{self.openweather_base_url}/weather",
+                              self._openweather_params(city))
+
+    def fetch_openweather_pollution(self, city):
+        return self._get_json('openweather', f"{self.openweather_base_url}/air_pollution",
+                              self._openweather_params(city))
+
+    def fetch_airvisual_raw(self, city):
+        params = {
+            'lat': city['lat'],
+            'lon': city['lon'],
+            'key': self.airvisual_key
+        }
+        return self._get_json('airvisual', f"{self.airvisual_base_url}/nearest_city", params)
+
+    @staticmethod
+    def parse_openweather_data(city, weather_data, pollution_data):
+        return {
+            'city': city['name'],
+            'country': city['country'],
+            'timestamp': datetime.utcnow().isoformat(),
+            'temperature': weather_data['main']['temp'],
+            'humidity': weather_data['main']['humidity'],
+            'wind_speed': weather_data['wind']['speed'],
+            'aqi': pollution_data['list'][0]['main']['aqi'],
+            'co': pollution_data['list'][0]['components']['co'],
+            'no': pollution_data['list'][0]['components']['no'],
+            'no2': pollution_data['list'][0]['components']['no2'],
+            'o3': pollution_data['list'][0]['components']['o3'],
+            'so2': pollution_data['list'][0]['components']['so2'],
+            'pm2_5': pollution_data['list'][0]['components']['pm2_5'],
+            'pm10': pollution_data['list'][0]['components']['pm10']
+        }
+
+    @staticmethod
+    def parse_airvisual_data(city, data):
+        if data['status'] == 'success':
             return {
                 'city': city['name'],
                 'country': city['country'],
                 'timestamp': datetime.utcnow().isoformat(),
-                'temperature': weather_data['main']['temp'],
-                'humidity': weather_data['main']['humidity'],
-                'wind_speed': weather_data['wind']['speed'],
-                'aqi': pollution_data['list'][0]['main']['aqi'],
-                'co': pollution_data['list'][0]['components']['co'],
-                'no': pollution_data['list'][0]['components']['no'],
-                'no2': pollution_data['list'][0]['components']['no2'],
-                'o3': pollution_data['list'][0]['components']['o3'],
-                'so2': pollution_data['list'][0]['components']['so2'],
-                'pm2_5': pollution_data['list'][0]['components']['pm2_5'],
-                'pm10': pollution_data['list'][0]['components']['pm10']
+                'aqi': data['data']['current']['pollution']['aqius'],
+                'main_pollutant': data['data']['current']['pollution']['mainus']
             }
+        return None
+
+    def fetch_openweather_data(self, city):
+        """Fetch weather and pollution data from OpenWeatherMap"""
+        try:
+            return self.parse_openweather_data(
+                city,
+                self.fetch_openweather_weather(city),
+                self.fetch_openweather_pollution(city)
+            )
         except Exception as e:
             logging.error(f"Error fetching OpenWeatherMap data for {city['name']}: {e}")
             return None
@@ -61,47 +184,76 @@ class EnvironmentalDataCollector:
     def fetch_airvisual_data(self, city):
         """Fetch air quality data from AirVisual API"""
         try:
-            url = f"{Config.AIRVISUAL_BASE_URL}/nearest_city"
-            params = {
-                'lat': city['lat'],
-                'lon': city['lon'],
-                'key': self.airvisual_key
-            }
-            
-            response = requests.get(url, params=params)
-            data = response.json()
-            
-            if data['status'] == 'success':
-                return {
-                    'city': city['name'],
-                    'country': city['country'],
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'aqi': data['data']['current']['pollution']['aqius'],
-                    'main_pollutant': data['data']['current']['pollution']['mainus']
-                }
+            return self.parse_airvisual_data(city, self.fetch_airvisual_raw(city))
         except Exception as e:
             logging.error(f"Error fetching AirVisual data for {city['name']}: {e}")
             return None
 
-    def collect_data(self):
-        """Collect data for all configured cities"""
+    def _collect_city(self, city, weather_future, pollution_future, airvisual_future):
+        try:
+            openweather_data = self.parse_openweather_data(
+                city, weather_future.result(), pollution_future.result())
+        except Exception as e:
+            logging.error(f"Error fetching OpenWeatherMap data for {city['name']}: {e}")
+            return None
+        
+        try:
+            airvisual_data = self.parse_airvisual_data(city, airvisual_future.result())
+        except Exception as e:
+            logging.error(f"Error fetching AirVisual data for {city['name']}: {e}")
+            return None
+        
+        # Combine data
+        if openweather_data and airvisual_data:
+            return {**openweather_data, **airvisual_data}
+        return None
+
+    def collect_data(self, cities=None):
+        """
+        Collect data for all configured cities
+        
+        Every (city, endpoint) request is submitted to a bounded thread pool,
+        so collection time is driven by the slowest requests rather than
+        3 x cities x round-trip time.
+        
+        :param cities: Cities to collect, defaults to Config.CITIES
+        :return: Path of the written data, or None if nothing was collected
+        """
+        cities = Config.CITIES if cities is None else cities
         all_data = []
         
-        for city in Config.CITIES:
-            # Collect data from both APIs
-            openweather_data = self.fetch_openweather_data(city)
-            airvisual_data = self.fetch_airvisual_data(city)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = [
+                (city,
+                 executor.submit(self.fetch_openweather_weather, city),
+                 executor.submit(self.fetch_openweather_pollution, city),
+                 executor.submit(self.fetch_airvisual_raw, city))
+                for city in cities
+            ]
             
-            # Combine data
-            if openweather_data and airvisual_data:
-                combined_data = {**openweather_data, **airvisual_data}
-                all_data.append(combined_data)
+            # Keep Config.CITIES order in the output
+            for city, weather_future, pollution_future, airvisual_future in pending:
+                combined_data = self._collect_city(city, weather_future, pollution_future, airvisual_future)
+                if combined_data:
+                    all_data.append(combined_data)
+        
+        self.log_request_stats()
         
         # Create DataFrame and save
         if all_data:
             df = pd.DataFrame(all_data)
-            filename = f"{self.data_dir}/environmental_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            self.score_predictions(df)
+            
+            if self.store is not None:
+                rows = self.store.append(df)
+                ROWS_WRITTEN.labels(backend='parquet').inc(rows)
+                self.store.compact()
+                logging.info(f"{rows} rows appended to {self.store.base_dir}")
+                return self.store.base_dir
+            
+            filename = os.path.join(self.data_dir, f"environmental_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
             df.to_csv(filename, index=False)
+            ROWS_WRITTEN.labels(backend='csv').inc(len(df))
             logging.info(f"Data saved to {filename}")
             return filename
         
@@ -112,19 +264,17 @@ class EnvironmentalDataCollector:
 def main():
     collector = EnvironmentalDataCollector()
     data_file = collector.collect_data()
+    push_metrics('data_collection')
     
     if data_file:
-        # DVC commands to version the data
-        import subprocess
+        # Version the new data with DVC in batches, off the collection path
+        import dvc_versioning
         
-        # Add the new data file to DVC tracking
-        subprocess.run(['/home/abdulrafay/.local/bin/dvc', 'add', data_file], check=True)
-        
-        # Commit changes
-        subprocess.run(['/home/abdulrafay/.local/bin/dvc', 'commit'], check=True)
-        
-        # Push to remote storage
-        subprocess.run(['/home/abdulrafay/.local/bin/dvc', 'push'], check=True)
+        dvc_versioning.enqueue(data_file)
+        if dvc_versioning.batch_due(dvc_versioning.read_queue()):
+            dvc_versioning.flush_in_background()
+    
+    return data_file
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,22 +1,61 @@
 import os
+import re
+import json
+import time
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.impute import SimpleImputer
+from metrics import PREPROCESS_DURATION, ROWS_DROPPED
+
+
+DVC_MD5_PATTERN = re.compile(r'md5:\s*([0-9a-f]+)')
+
+# Features and target
+FEATURES = ['temperature', 'humidity', 'wind_speed', 'co', 'no', 'no2', 'o3', 'so2', 'pm2_5', 'pm10']
+TARGET = 'aqi'
+
+CLEANING_PARAMS_PATH = '../models/cleaning_params.json'
+
+# Collected data read by training, incremental updates and the pipeline
+RAW_DATA_DIR = '../data/raw/'
+PARQUET_DATA_DIR = '../data/parquet/'
+
+
+def parse_timestamps(values, utc=False):
+    """
+    Parse collected timestamps.
+
+    ``datetime.isoformat()`` omits the fractional part when it is zero, so
+    one file can mix precisions; inferring the format from the first value
+    would reject the others.
+
+    :param values: Timestamp strings or datetimes
+    :param utc: Return timezone-aware UTC timestamps
+    :return: Parsed timestamps of the same shape
+    """
+    return pd.to_datetime(values, format='ISO8601', utc=utc)
 
 
 class DataLoader:
+    CACHE_FILENAME = 'csv_cache.pkl'
+
     @staticmethod
-    def load_all_csv_files(directory):
+    def load_all_csv_files(directory, cache_dir=None):
         """
         Load all CSV files from the specified directory
         
         :param directory: Path to the directory containing CSV files
+        :param cache_dir: Directory for the consolidated cache; when given only
+            files missing from the cache manifest are parsed
         :return: Concatenated DataFrame of all CSV files
         """
+        if cache_dir is not None:
+            return DataLoader.load_csv_files_incremental(directory, cache_dir)
+        
         # List all CSV files in the directory
-        csv_files = [f for f in os.listdir(directory) if f.endswith('.csv')]
+        csv_files = sorted(f for f in os.listdir(directory) if f.endswith('.csv'))
         
         # Check if any files exist
         if not csv_files:
@@ -37,43 +76,218 @@ class DataLoader:
         
         return combined_df
 
-def preprocess_data(df):
+    @staticmethod
+    def file_fingerprint(file_path):
+        """
+        Identify a file's content without reading it
+        
+        Uses the md5 recorded in the file's .dvc pointer when one exists,
+        combined with the current size and mtime.
+        
+        :param file_path: Path to the CSV file
+        :return: Fingerprint string
+        """
+        stat = os.stat(file_path)
+        fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+        
+        dvc_path = f"{file_path}.dvc"
+        if os.path.exists(dvc_path):
+            with open(dvc_path) as f:
+                match = DVC_MD5_PATTERN.search(f.read())
+            if match:
+                # The md5 survives checkouts that only touch mtime
+                fingerprint = f"{stat.st_size}:{match.group(1)}"
+        
+        return fingerprint
+
+    @staticmethod
+    def load_csv_files_incremental(directory, cache_dir):
+        """
+        Load all CSV files, parsing only files not already in the cache
+        
+        The cache is a single pickle holding a manifest of ingested files and
+        the consolidated DataFrame. New files are appended to it; if a cached
+        file changed or disappeared the cache is rebuilt from scratch.
+        
+        :param directory: Path to the directory containing CSV files
+        :param cache_dir: Directory holding the cache file
+        :return: Concatenated DataFrame of all CSV files
+        """
+        csv_files = sorted(f for f in os.listdir(directory) if f.endswith('.csv'))
+        if not csv_files:
+            raise ValueError(f"No CSV files found in {directory}")
+        
+        fingerprints = {
+            file: DataLoader.file_fingerprint(os.path.join(directory, file))
+            for file in csv_files
+        }
+        
+        cache_path = os.path.join(cache_dir, DataLoader.CACHE_FILENAME)
+        manifest, cached_df = {}, None
+        if os.path.exists(cache_path):
+            try:
+                cache = pd.read_pickle(cache_path)
+                manifest, cached_df = cache['manifest'], cache['frame']
+            except Exception as e:
+                print(f"Error reading cache {cache_path}: {e}")
+        
+        # Any changed or removed file invalidates the whole cache
+        if any(fingerprints.get(file) != fingerprint for file, fingerprint in manifest.items()):
+            manifest, cached_df = {}, None
+        
+        new_files = [file for file in csv_files if file not in manifest]
+        if not new_files and cached_df is not None:
+            return cached_df
+        
+        dataframes = [] if cached_df is None else [cached_df]
+        for file in new_files:
+            try:
+                dataframes.append(pd.read_csv(os.path.join(directory, file)))
+                manifest[file] = fingerprints[file]
+            except Exception as e:
+                print(f"Error reading {file}: {e}")
+        
+        if not dataframes:
+            raise ValueError(f"No readable CSV files found in {directory}")
+        combined_df = pd.concat(dataframes, ignore_index=True)
+        
+        # Manifest and frame go in one file so they can never disagree
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        pd.to_pickle({'manifest': manifest, 'frame': combined_df}, tmp_path)
+        os.replace(tmp_path, cache_path)
+        
+        return combined_df
+
+    @staticmethod
+    def load_from_store(base_dir, columns=None, start=None, end=None, cities=None):
+        """
+        Load rows from the partitioned Parquet store
+        
+        :param base_dir: Root directory of the ParquetStore
+        :param columns: Columns to load, all columns if None
+        :param start: Inclusive lower bound on timestamp
+        :param end: Exclusive upper bound on timestamp
+        :param cities: Cities to load, all cities if None
+        :return: DataFrame of the matching rows
+        """
+        from storage import ParquetStore
+        
+        df = ParquetStore(base_dir).read(columns=columns, start=start, end=end, cities=cities)
+        if df.empty:
+            raise ValueError(f"No rows found in {base_dir}")
+        
+        return df
+
+def fit_cleaning_params(df, columns=None):
     """
-    Preprocess environmental data.
+    Compute imputation medians and IQR outlier bounds in a single pass.
+    
+    Quartiles are taken on the median-imputed columns of the full frame,
+    so every column's bounds are independent of the other columns' filters.
     
     Args:
         df (pandas.DataFrame): Input dataframe
+        columns (list, optional): Columns to clean, defaults to features and target
     
     Returns:
-        pandas.DataFrame: Preprocessed data
+        dict: Columns, medians, and lower/upper bounds per column
     """
-    # Features and target
-    features = ['temperature', 'humidity', 'wind_speed', 'co', 'no', 'no2', 'o3', 'so2', 'pm2_5', 'pm10']
-    target = 'aqi'
+    columns = columns or FEATURES + [TARGET]
+    values = df[columns]
     
-    # Create a copy of the dataframe
-    df_processed = df.copy()
+    medians = values.median()
+    quartiles = values.fillna(medians).quantile([0.25, 0.75])
+    q1, q3 = quartiles.loc[0.25], quartiles.loc[0.75]
+    iqr = q3 - q1
     
-    # Handle missing values
-    for column in features + [target]:
-        # Fill missing values with median
-        df_processed[column].fillna(df_processed[column].median(), inplace=True)
+    return {
+        'columns': list(columns),
+        'medians': medians.to_dict(),
+        'lower': (q1 - 1.5 * iqr).to_dict(),
+        'upper': (q3 + 1.5 * iqr).to_dict()
+    }
+
+def apply_cleaning(df, cleaning_params):
+    """
+    Impute missing values and drop outlier rows using fitted parameters.
     
-    # Remove outliers using Interquartile Range (IQR) method for each feature
-    for column in features + [target]:
-        Q1 = df_processed[column].quantile(0.25)
-        Q3 = df_processed[column].quantile(0.75)
-        IQR = Q3 - Q1
-        
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        
-        # Filter out outliers
-        df_processed = df_processed[
-            (df_processed[column] >= lower_bound) & 
-            (df_processed[column] <= upper_bound)
-        ]
+    Columns of the fitted parameters that are absent from ``df`` are skipped.
+    
+    Args:
+        df (pandas.DataFrame): Input dataframe
+        cleaning_params (dict): Output of fit_cleaning_params
+    
+    Returns:
+        pandas.DataFrame: Cleaned data
+    """
+    columns = [column for column in cleaning_params['columns'] if column in df.columns]
+    medians = pd.Series(cleaning_params['medians'])[columns]
+    lower = pd.Series(cleaning_params['lower'])[columns]
+    upper = pd.Series(cleaning_params['upper'])[columns]
+    
+    filled = df[columns].fillna(medians)
+    
+    # One combined mask instead of re-filtering the frame per column
+    mask = ((filled >= lower) & (filled <= upper)).all(axis=1)
+    ROWS_DROPPED.labels(reason='iqr').inc(int(len(mask) - mask.sum()))
+    
+    df_processed = df.loc[mask].copy()
+    df_processed[columns] = filled.loc[mask]
+    return df_processed
+
+def save_cleaning_params(cleaning_params, filename=CLEANING_PARAMS_PATH):
+    """
+    Persist fitted cleaning parameters as JSON.
+    
+    Args:
+        cleaning_params (dict): Output of fit_cleaning_params
+        filename (str): Destination path
+    
+    Returns:
+        str: Path to the saved parameters
+    """
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'w') as f:
+        json.dump(cleaning_params, f, indent=2)
+    os.replace(tmp_filename, filename)
+    return filename
+
+def load_cleaning_params(filename=CLEANING_PARAMS_PATH):
+    """
+    Load cleaning parameters saved by save_cleaning_params.
+    
+    Args:
+        filename (str): Path to the saved parameters
+    
+    Returns:
+        dict: Cleaning parameters
+    """
+    with open(filename) as f:
+        return json.load(f)
+
+def preprocess_data(df, cleaning_params=None):
+    """
+    Preprocess environmental data.
+    
+    Missing values are filled with column medians and rows outside the
+    1.5 x IQR range of any feature or the target are removed.
+    
+    Args:
+        df (pandas.DataFrame): Input dataframe
+        cleaning_params (dict, optional): Previously fitted parameters; fitted on
+            ``df`` when omitted
+    
+    Returns:
+        pandas.DataFrame: Preprocessed data
+    """
+    start_time = time.perf_counter()
+    if cleaning_params is None:
+        cleaning_params = fit_cleaning_params(df)
     
+    df_processed = apply_cleaning(df, cleaning_params)
+    PREPROCESS_DURATION.observe(time.perf_counter() - start_time)
     return df_processed
 
 # def feature_engineering(df):
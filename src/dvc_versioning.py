@@ -0,0 +1,132 @@
+import argparse
+import contextlib
+import fcntl
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+QUEUE_PATH = '../data/dvc_queue.tsv'
+LOCK_PATH = '../data/dvc_queue.lock'
+LOG_PATH = '../data/dvc_versioning.log'
+
+DVC_BIN = os.environ.get('DVC_BIN', shutil.which('dvc') or '/home/abdulrafay/.local/bin/dvc')
+
+# A batch is versioned once it has this many paths or its oldest entry is this old
+BATCH_SIZE = 12
+MAX_DELAY_SECONDS = 6 * 60 * 60
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path, blocking=True):
+    # Yields False instead of waiting when ``blocking`` is off and the lock is taken
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    with open(lock_path, 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def enqueue(path, queue_path=QUEUE_PATH):
+    """
+    Queue a data file or directory for the next DVC batch.
+
+    :param path: Path to track with DVC
+    :param queue_path: Queue file, one "<enqueued_at>\\t<path>" line per entry
+    """
+    # Held only around queue edits, never while DVC runs
+    with _file_lock(f"{queue_path}.lock"):
+        with open(queue_path, 'a') as f:
+            f.write(f"{time.time()}\t{os.path.abspath(path)}\n")
+
+
+def read_queue(queue_path=QUEUE_PATH):
+    """
+    :return: List of (enqueued_at, path) entries in queue order
+    """
+    if not os.path.exists(queue_path):
+        return []
+    entries = []
+    with open(queue_path) as f:
+        for line in f:
+            enqueued_at, _, path = line.rstrip('\n').partition('\t')
+            if path:
+                entries.append((float(enqueued_at), path))
+    return entries
+
+
+def batch_due(entries, now=None, batch_size=BATCH_SIZE, max_delay=MAX_DELAY_SECONDS):
+    if not entries:
+        return False
+    now = time.time() if now is None else now
+    return len({path for _, path in entries}) >= batch_size or now - entries[0][0] >= max_delay
+
+
+def flush(queue_path=QUEUE_PATH, lock_path=LOCK_PATH):
+    """
+    Version every queued path with one dvc add, commit and push.
+
+    Only one flush runs at a time; a concurrent call returns immediately.
+    Entries are removed from the queue only after the push succeeded, so a
+    failed batch is retried with the next one.
+
+    :return: Number of paths versioned, or None if another flush holds the lock
+    """
+    with _file_lock(lock_path, blocking=False) as acquired:
+        if not acquired:
+            return None
+
+        entries = read_queue(queue_path)
+        # Files may have been compacted or removed since they were queued
+        paths = list(dict.fromkeys(path for _, path in entries if os.path.exists(path)))
+        if paths:
+            subprocess.run([DVC_BIN, 'add', *paths], check=True)
+            subprocess.run([DVC_BIN, 'commit'], check=True)
+            subprocess.run([DVC_BIN, 'push'], check=True)
+
+        # Keep entries appended while the batch was running
+        with _file_lock(f"{queue_path}.lock"):
+            remaining = read_queue(queue_path)[len(entries):]
+            tmp_path = f"{queue_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.writelines(f"{enqueued_at}\t{path}\n" for enqueued_at, path in remaining)
+            os.replace(tmp_path, queue_path)
+        return len(paths)
+
+
+def flush_in_background(log_path=LOG_PATH):
+    """
+    Start a detached flush so DVC never blocks the caller.
+
+    :return: The started process
+    """
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    with open(log_path, 'a') as log:
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), 'flush'],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch DVC versioning of collected data")
+    parser.add_argument('command', choices=['flush', 'status'])
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        entries = read_queue()
+        print(f"{len(entries)} queued paths, batch due: {batch_due(entries)}")
+        return
+
+    versioned = flush()
+    if versioned is None:
+        print("Another flush is running")
+    else:
+        print(f"Versioned {versioned} paths")
+
+
+if __name__ == '__main__':
+    main()
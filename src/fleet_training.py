@@ -0,0 +1,182 @@
+import argparse
+import itertools
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import mlflow
+import pandas as pd
+
+from accuracy_tracker import step_interval
+from arima_search import DEFAULT_FIT_TIMEOUT, parallel_grid_search
+from data_preprocessing import (PARQUET_DATA_DIR, RAW_DATA_DIR, fit_cleaning_params, parse_timestamps,
+                                preprocess_data, save_cleaning_params)
+from model_store import DEFAULT_KEEP_VERSIONS, ModelStore
+from model_training import load_training_frame, residual_rmse
+
+warnings.filterwarnings("ignore")
+
+# Cities with fewer cleaned observations than this are left to the global model
+MIN_OBSERVATIONS = 30
+
+GRID_ORDERS = list(itertools.product(range(0, 3), range(0, 2), range(0, 3)))
+
+
+def city_series(df, targets=('aqi',)):
+    """
+    Split a multi-city frame into one time-ordered series per (city, target).
+
+    Args:
+        df (pandas.DataFrame): Preprocessed data with city and timestamp columns
+        targets (tuple, optional): Columns to build series for
+
+    Yields:
+        tuple: City, target, series with a RangeIndex, last timestamp, and
+            seconds per step (None if the city's series has no fixed step)
+    """
+    df = df.assign(timestamp=parse_timestamps(df['timestamp']))
+    for city, group in df.groupby('city', sort=True):
+        group = group.sort_values('timestamp', kind='stable')
+        step_seconds = step_interval(group['timestamp'])
+        for target in targets:
+            yield city, target, group[target].reset_index(drop=True), group['timestamp'].max(), step_seconds
+
+
+def train_city_model(city, target, series, fit_timeout=DEFAULT_FIT_TIMEOUT):
+    """
+    Grid-search one city's series in the current process.
+
+    Args:
+        city (str): City name
+        target (str): Target column
+        series (pandas.Series): Time-ordered series with a RangeIndex
+        fit_timeout (float, optional): Per-fit time limit in seconds
+
+    Returns:
+        dict: City, target, best model and order, metrics, or the error
+    """
+    start_time = time.time()
+    train_size = int(len(series) * 0.8)
+    train, test = series[:train_size], series[train_size:]
+
+    best = None
+    failures = 0
+    # Candidates run serially: cities are the unit of parallelism here
+    for result in parallel_grid_search(train, test, GRID_ORDERS, n_jobs=1, fit_timeout=fit_timeout):
+        if result['error']:
+            failures += 1
+        elif best is None or result['rmse'] < best['rmse']:
+            best = result
+
+    if best is None:
+        return {'city': city, 'target': target, 'error': "no valid ARIMA configuration"}
+
+    # Absorb the test split so forecasts start from the latest observation
+    model = best['model'].append(test, refit=False)
+    return {
+        'city': city,
+        'target': target,
+        'error': None,
+        'model': model,
+        'order': best['order'],
+        'rmse': best['rmse'],
+        'mae': best['mae'],
+        'failed_fits': failures,
+        'train_time': time.time() - start_time
+    }
+
+
+def train_fleet(df, store, targets=('aqi',), n_jobs=None, fit_timeout=DEFAULT_FIT_TIMEOUT,
+                min_observations=MIN_OBSERVATIONS, keep_versions=DEFAULT_KEEP_VERSIONS):
+    """
+    Train one model per city (and target) in parallel and store them.
+
+    Args:
+        df (pandas.DataFrame): Preprocessed multi-city data
+        store (ModelStore): Destination of the trained models
+        targets (tuple, optional): Columns to model per city
+        n_jobs (int, optional): Worker processes, defaults to the CPU count
+        fit_timeout (float, optional): Per-fit time limit in seconds
+        min_observations (int, optional): Minimum series length to train
+        keep_versions (int, optional): Versions of each model kept on disk
+
+    Returns:
+        dict: Stored version per (city, target)
+    """
+    jobs = []
+    last_timestamps = {}
+    step_intervals = {}
+    for city, target, series, last_timestamp, step_seconds in city_series(df, targets):
+        if len(series) < min_observations:
+            print(f"Skipping {city} ({target}): {len(series)} observations")
+            continue
+        jobs.append((city, target, series))
+        last_timestamps[(city, target)] = last_timestamp
+        step_intervals[(city, target)] = step_seconds
+
+    versions = {}
+    n_jobs = n_jobs or os.cpu_count() or 1
+    with mlflow.start_run(run_name="ARIMA_Fleet_Training"):
+        mlflow.log_params({'cities': len(jobs), 'n_jobs': n_jobs})
+
+        with ProcessPoolExecutor(max_workers=max(1, min(n_jobs, len(jobs)))) as executor:
+            futures = [executor.submit(train_city_model, city, target, series, fit_timeout)
+                       for city, target, series in jobs]
+
+            # Logging and saving stay in the parent process
+            for future in as_completed(futures):
+                result = future.result()
+                city, target = result['city'], result['target']
+
+                with mlflow.start_run(run_name=f"{city}_{target}", nested=True):
+                    mlflow.log_params({'city': city, 'target': target})
+                    if result['error']:
+                        mlflow.log_param('error', result['error'])
+                        print(f"Error training {city} ({target}): {result['error']}")
+                        continue
+
+                    mlflow.log_param('arima_order', result['order'])
+                    mlflow.log_metrics({
+                        'rmse': result['rmse'],
+                        'mae': result['mae'],
+                        'train_time_seconds': result['train_time']
+                    })
+
+                now = time.time()
+                versions[(city, target)] = store.save(city, {
+                    'order': result['order'],
+                    'model': result['model'],
+                    'trained_at': now,
+                    'updated_at': now,
+                    'last_timestamp': str(last_timestamps[(city, target)]),
+                    'step_seconds': step_intervals[(city, target)],
+                    'baseline_rmse': residual_rmse(result['model'])
+                }, target)
+                store.prune(city, target, keep_versions)
+                print(f"Stored {city} ({target}) version {versions[(city, target)]}, order {result['order']}")
+
+    return versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train one ARIMA model per city")
+    parser.add_argument('--targets', nargs='+', default=['aqi'],
+                        help="columns to model per city, e.g. aqi pm2_5")
+    parser.add_argument('--n-jobs', type=int, default=None)
+    args = parser.parse_args()
+
+    mlflow.set_experiment('aqi_prediction')
+
+    # Same data and cleaning as the global model, which incremental_update
+    # applies to the fleet as well
+    df = load_training_frame(RAW_DATA_DIR, PARQUET_DATA_DIR)
+    cleaning_params = fit_cleaning_params(df)
+    save_cleaning_params(cleaning_params)
+    df_processed = preprocess_data(df, cleaning_params)
+
+    train_fleet(df_processed, ModelStore(), targets=tuple(args.targets), n_jobs=args.n_jobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import threading
+from collections import OrderedDict
+from statistics import NormalDist
+
+DEFAULT_MAX_HORIZON = 72
+DEFAULT_ALPHAS = (0.01, 0.05, 0.1, 0.2)
+DEFAULT_MAX_MODELS = 64
+
+
+def _z_value(alpha):
+    # Same two-sided normal quantile statsmodels uses in conf_int
+    return NormalDist().inv_cdf(1 - alpha / 2)
+
+
+class ForecastCache:
+    """
+    Forecasts for horizons 1..max_horizon precomputed once per model version.
+
+    The model is asked for a single max_horizon forecast; the predicted mean
+    and standard errors are kept and the intervals for every (horizon, alpha)
+    pair in ``alphas`` are materialised up front. Other alpha levels are
+    derived from the stored standard errors on every request and never
+    stored, so client-chosen alphas cannot grow a snapshot.
+    Snapshots of up to ``max_models`` model versions (e.g. one per city) are
+    kept in LRU order.
+    """
+
+    def __init__(self, max_horizon=DEFAULT_MAX_HORIZON, alphas=DEFAULT_ALPHAS,
+                 max_models=DEFAULT_MAX_MODELS):
+        """
+        :param max_horizon: Largest number of steps that can be requested
+        :param alphas: Significance levels precomputed for every horizon
+        :param max_models: Number of model versions whose forecasts are kept
+        """
+        self.max_horizon = max_horizon
+        self.alphas = tuple(alphas)
+        self.max_models = max_models
+        self._snapshots = OrderedDict()
+        self._build_lock = threading.Lock()
+
+    def _build(self, model_data):
+        # Deferred so importing the service does not pay for numpy
+        import numpy as np
+
+        forecast = model_data['model'].get_forecast(steps=self.max_horizon)
+        mean = np.asarray(forecast.predicted_mean, dtype=float)
+        se = np.sqrt(np.asarray(forecast.var_pred_mean, dtype=float))
+        return self._snapshot(model_data['version'], mean, se)
+
+    def _snapshot(self, version, mean, se, precompute=True):
+        # Single-horizon entries are materialised up front for the common
+        # alphas; batch-built snapshots leave them to be derived on demand
+        entries = {}
+        for alpha in (self.alphas if precompute else ()):
+            z = _z_value(alpha)
+            lower = mean - z * se
+            upper = mean + z * se
+            for step in range(1, self.max_horizon + 1):
+                entries[(step, alpha)] = (
+                    float(mean[step - 1]),
+                    float(lower[step - 1]),
+                    float(upper[step - 1])
+                )
+
+        return {
+            'version': version,
+            'mean': mean,
+            'se': se,
+            'entries': entries,
+            'paths': {}
+        }
+
+    def refresh(self, model_data):
+        """
+        Compute the cache for ``model_data`` unless it is already present.
+        """
+        version = model_data['version']
+        with self._build_lock:
+            snapshot = self._snapshots.get(version)
+            if snapshot is None:
+                snapshot = self._build(model_data)
+                self._snapshots[version] = snapshot
+            self._snapshots.move_to_end(version)
+            while len(self._snapshots) > self.max_models:
+                self._snapshots.popitem(last=False)
+            return snapshot
+
+    def refresh_many(self, models):
+        """
+        Snapshots for several models, computing the missing ones together.
+
+        Uncached compact models are forecast in one BatchForecaster pass;
+        any other model falls back to its own get_forecast.
+
+        :param models: Model data dicts from the ModelRegistry
+        :return: Dict mapping model version to snapshot
+        """
+        import numpy as np
+        from batch_forecaster import BatchForecaster, is_batchable
+
+        snapshots = {}
+        missing = {}
+        for model_data in models:
+            version = model_data['version']
+            snapshot = self._snapshots.get(version)
+            if snapshot is not None:
+                snapshots[version] = snapshot
+            elif version not in missing:
+                missing[version] = model_data
+
+        batchable = [model_data for model_data in missing.values() if is_batchable(model_data['model'])]
+        if batchable:
+            mean, variance = BatchForecaster([model_data['model'] for model_data in batchable]).forecast(
+                self.max_horizon)
+            se = np.sqrt(variance)
+            built = {model_data['version']: self._snapshot(model_data['version'], mean[row].copy(), se[row].copy(), False)
+                     for row, model_data in enumerate(batchable)}
+            with self._build_lock:
+                for version, snapshot in built.items():
+                    self._snapshots[version] = snapshot
+                    self._snapshots.move_to_end(version)
+                while len(self._snapshots) > self.max_models:
+                    self._snapshots.popitem(last=False)
+            snapshots.update(built)
+
+        for version, model_data in missing.items():
+            if version not in snapshots:
+                snapshots[version] = self.refresh(model_data)
+        return snapshots
+
+    def _current(self, model_data):
+        snapshot = self._snapshots.get(model_data['version'])
+        if snapshot is None:
+            snapshot = self.refresh(model_data)
+        return snapshot
+
+    def validate(self, steps, alpha):
+        if not 1 <= steps <= self.max_horizon:
+            raise ValueError(f"steps must be between 1 and {self.max_horizon}")
+        if not 0 < alpha < 1:
+            raise ValueError("alpha must be between 0 and 1")
+
+    def get(self, model_data, steps=1, alpha=0.05):
+        """
+        Forecast for a single horizon.
+
+        :param model_data: Model data dict from the ModelRegistry
+        :param steps: Forecast horizon
+        :param alpha: Significance level of the prediction interval
+        :return: Tuple of (predicted mean, lower bound, upper bound)
+        """
+        self.validate(steps, alpha)
+        snapshot = self._current(model_data)
+        key = (steps, alpha)
+        try:
+            return snapshot['entries'][key]
+        except KeyError:
+            z = _z_value(alpha)
+            mean = float(snapshot['mean'][steps - 1])
+            se = float(snapshot['se'][steps - 1])
+            entry = (mean, mean - z * se, mean + z * se)
+            if alpha in self.alphas:
+                snapshot['entries'][key] = entry
+            return entry
+
+    def paths(self, model_data, alpha=0.05):
+        """
+        Full forecast path over all cached horizons.
+
+        :param model_data: Model data dict from the ModelRegistry
+        :param alpha: Significance level of the prediction intervals
+        :return: Tuple of (mean, lower, upper) arrays of length max_horizon
+        """
+        self.validate(1, alpha)
+        return self.snapshot_paths(self._current(model_data), alpha)
+
+    def snapshot_paths(self, snapshot, alpha=0.05):
+        """
+        Full forecast path of a snapshot returned by refresh_many.
+        """
+        try:
+            return snapshot['paths'][alpha]
+        except KeyError:
+            z = _z_value(alpha)
+            mean = snapshot['mean']
+            path = (mean, mean - z * snapshot['se'], mean + z * snapshot['se'])
+            if alpha in self.alphas:
+                snapshot['paths'][alpha] = path
+            return path
@@ -0,0 +1,230 @@
+import os
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import model_training
+from accuracy_tracker import AccuracyTracker
+from data_preprocessing import (CLEANING_PARAMS_PATH, PARQUET_DATA_DIR, RAW_DATA_DIR, apply_cleaning,
+                                load_cleaning_params, parse_timestamps)
+from model_store import DEFAULT_FLEET_DIR, DEFAULT_KEEP_VERSIONS, ModelStore
+from model_training import load_training_frame, save_best_model
+
+warnings.filterwarnings("ignore")
+
+MODEL_PATH = '../models/model.pkl'
+FLEET_DIR = DEFAULT_FLEET_DIR
+
+# Versions of each per-city model kept on disk after an update
+KEEP_FLEET_VERSIONS = DEFAULT_KEEP_VERSIONS
+
+# A full grid search runs at least this often
+FULL_REFIT_INTERVAL_SECONDS = 24 * 60 * 60
+
+# Refit when the one-step RMSE on new data exceeds the training residual RMSE by this factor
+DRIFT_THRESHOLD = 1.5
+
+# Refit when served intervals cover this much less than their nominal level,
+# once enough served forecasts have been scored
+COVERAGE_TOLERANCE = 0.1
+MIN_SCORED_PREDICTIONS = 50
+
+
+def load_new_observations(last_timestamp, cleaning_params=None, raw_data_dir=RAW_DATA_DIR,
+                          parquet_data_dir=PARQUET_DATA_DIR):
+    """
+    Read AQI observations collected after ``last_timestamp``.
+
+    Rows come from the same source full training reads: the Parquet store
+    when it has data, otherwise the cached raw CSVs. New rows are cleaned
+    with the medians and bounds fitted at training time, so a handful of
+    rows is never used to estimate its own outlier bounds.
+
+    :param last_timestamp: Timestamp of the newest observation already in the model
+    :param cleaning_params: Parameters from fit_cleaning_params; rows with
+        missing AQI are dropped when omitted
+    :param raw_data_dir: Directory of raw collection CSVs
+    :param parquet_data_dir: Root of the Parquet store
+    :return: Cleaned new rows in time order
+    """
+    last_timestamp = pd.Timestamp(last_timestamp)
+    df = load_training_frame(raw_data_dir, parquet_data_dir, start=last_timestamp)
+    if df.empty:
+        return pd.DataFrame(columns=['timestamp', 'aqi'])
+
+    df = df.copy()
+    df['timestamp'] = parse_timestamps(df['timestamp'])
+    df = df[df['timestamp'] > last_timestamp]
+    if cleaning_params is not None:
+        df = apply_cleaning(df, cleaning_params)
+    else:
+        df = df[df['aqi'].notna()]
+    return df.sort_values('timestamp', kind='stable')
+
+
+def needs_full_refit(model_data, one_step_rmse=None, now=None, served_accuracy=None):
+    """
+    Decide whether the saved model should be replaced by a full retrain.
+
+    :param model_data: Saved model data dict
+    :param one_step_rmse: One-step-ahead RMSE of the model on new observations
+    :param now: Current time, defaults to time.time()
+    :param served_accuracy: AccuracyTracker summary of the global model's served forecasts
+    :return: Reason for a refit, or None
+    """
+    now = time.time() if now is None else now
+    trained_at = model_data.get('trained_at')
+    if trained_at is None or now - trained_at >= FULL_REFIT_INTERVAL_SECONDS:
+        return 'scheduled'
+
+    baseline = model_data.get('baseline_rmse')
+    if one_step_rmse is not None and baseline and one_step_rmse > DRIFT_THRESHOLD * baseline:
+        return 'drift'
+
+    if (served_accuracy and served_accuracy['count'] >= MIN_SCORED_PREDICTIONS
+            and served_accuracy['coverage'] < served_accuracy['nominal_coverage'] - COVERAGE_TOLERANCE):
+        return 'coverage'
+
+    return None
+
+
+def update_model(model_data, new_values):
+    """
+    Absorb new observations into the saved results without refitting.
+
+    :param model_data: Saved model data dict
+    :param new_values: New AQI values in time order
+    :return: Tuple of (updated results, one-step-ahead RMSE on the new values)
+    """
+    model = model_data['model']
+    index = pd.RangeIndex(model.nobs, model.nobs + len(new_values))
+    new_series = pd.Series(np.asarray(new_values, dtype=float), index=index)
+
+    # extend only filters the new rows, giving the one-step-ahead errors
+    errors = np.asarray(model.extend(new_series).forecasts_error).ravel()
+    one_step_rmse = float(np.sqrt(np.mean(errors ** 2)))
+
+    updated = model.append(new_series, refit=False)
+    return updated, one_step_rmse
+
+
+def update_fleet(store, cleaning_params=None, keep_versions=KEEP_FLEET_VERSIONS):
+    """
+    Absorb new observations into every stored per-city model without refitting.
+
+    New rows are read once, from the oldest last_timestamp in the fleet
+    index, and each city model gets its own rows after its last_timestamp.
+    Models are loaded, updated and saved one city at a time, so memory does
+    not grow with the fleet. Orders are only reselected by fleet_training.
+
+    :param store: ModelStore holding the per-city models
+    :param cleaning_params: Parameters from fit_cleaning_params
+    :param keep_versions: Versions of each model kept on disk
+    :return: Number of city models updated
+    """
+    entries = list(store.read_index().values())
+    if not entries:
+        return 0
+
+    # Entries written before the index recorded last_timestamp need their model
+    since = min(pd.Timestamp(entry.get('last_timestamp')
+                             or store.load(entry['city'], entry['target'])['last_timestamp'])
+                for entry in entries)
+    new_data = load_new_observations(since, cleaning_params)
+    if new_data.empty:
+        print("No new observations, fleet models unchanged")
+        return 0
+
+    updated_count = 0
+    for entry in entries:
+        city, target = entry['city'], entry['target']
+        rows = new_data[(new_data['city'] == city) & new_data[target].notna()]
+        if rows.empty:
+            continue
+
+        model_data = store.load(city, target)
+        rows = rows[rows['timestamp'] > pd.Timestamp(model_data['last_timestamp'])]
+        if rows.empty:
+            continue
+
+        updated, one_step_rmse = update_model(model_data, rows[target])
+        baseline = model_data.get('baseline_rmse')
+        if baseline and one_step_rmse > DRIFT_THRESHOLD * baseline:
+            print(f"{city} ({target}) one-step RMSE {one_step_rmse:.2f} exceeds its baseline; "
+                  f"rerun fleet_training to refit")
+
+        metadata = {key: value for key, value in model_data.items() if key not in ('model', 'order')}
+        metadata.update({
+            'updated_at': time.time(),
+            'last_timestamp': str(rows['timestamp'].max()),
+            'last_one_step_rmse': one_step_rmse
+        })
+        store.save(city, {'order': model_data['order'], 'model': updated, **metadata}, target)
+        store.prune(city, target, keep_versions)
+        updated_count += 1
+
+    print(f"Updated {updated_count} of {len(entries)} city models")
+    return updated_count
+
+
+def update_global_model():
+    if not os.path.exists(MODEL_PATH):
+        print("No saved model, running full training")
+        model_training.main()
+        return
+
+    model_data = joblib.load(MODEL_PATH)
+    tracker = AccuracyTracker()
+    reason = needs_full_refit(model_data, served_accuracy=tracker.summary('global'))
+    if reason:
+        print(f"Full refit required ({reason})")
+        model_training.main()
+        # Scores of the replaced model would otherwise keep triggering refits
+        tracker.reset('global')
+        return
+
+    cleaning_params = None
+    if os.path.exists(CLEANING_PARAMS_PATH):
+        cleaning_params = load_cleaning_params(CLEANING_PARAMS_PATH)
+    new_data = load_new_observations(model_data['last_timestamp'], cleaning_params)
+    if new_data.empty:
+        print("No new observations, model unchanged")
+        return
+
+    start_time = time.time()
+    updated, one_step_rmse = update_model(model_data, new_data['aqi'])
+    print(f"One-step RMSE on {len(new_data)} new observations: {one_step_rmse}")
+
+    reason = needs_full_refit(model_data, one_step_rmse)
+    if reason:
+        print(f"Full refit required ({reason})")
+        model_training.main()
+        tracker.reset('global')
+        return
+
+    metadata = {key: value for key, value in model_data.items() if key not in ('model', 'order')}
+    metadata.update({
+        'updated_at': time.time(),
+        'last_timestamp': str(new_data['timestamp'].max()),
+        'last_one_step_rmse': one_step_rmse
+    })
+    save_best_model(updated, model_data['order'], MODEL_PATH, metadata)
+    print(f"Model updated incrementally in {time.time() - start_time:.3f}s")
+
+
+def main():
+    update_global_model()
+
+    # Per-city models take priority in the service, so they are kept as
+    # current as the global model; a full refit may rewrite the cleaning parameters
+    cleaning_params = None
+    if os.path.exists(CLEANING_PARAMS_PATH):
+        cleaning_params = load_cleaning_params(CLEANING_PARAMS_PATH)
+    update_fleet(ModelStore(FLEET_DIR), cleaning_params)
+
+
+if __name__ == '__main__':
+    main()
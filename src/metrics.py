@@ -0,0 +1,69 @@
+import os
+
+from prometheus_client import REGISTRY, Counter, Histogram, push_to_gateway
+
+# Batch jobs (collection, training) push to this gateway when it is set
+PUSHGATEWAY_ENV = 'PROMETHEUS_PUSHGATEWAY'
+
+FIT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Data collection
+UPSTREAM_REQUEST_LATENCY = Histogram(
+    'environmental_upstream_request_latency_seconds',
+    'Latency of HTTP requests to upstream weather/AQI APIs',
+    ['upstream', 'endpoint']
+)
+UPSTREAM_REQUEST_ERRORS = Counter(
+    'environmental_upstream_request_errors_total',
+    'Failed HTTP requests to upstream weather/AQI APIs',
+    ['upstream', 'endpoint']
+)
+ROWS_WRITTEN = Counter(
+    'environmental_rows_written_total',
+    'Collected rows written to storage',
+    ['backend']
+)
+
+# Preprocessing
+PREPROCESS_DURATION = Histogram(
+    'environmental_preprocessing_duration_seconds',
+    'Duration of preprocess_data'
+)
+ROWS_DROPPED = Counter(
+    'environmental_preprocessing_rows_dropped_total',
+    'Rows removed during preprocessing',
+    ['reason']
+)
+
+# Training
+ARIMA_FIT_DURATION = Histogram(
+    'arima_fit_duration_seconds',
+    'Duration of a single ARIMA candidate fit',
+    ['order'],
+    buckets=FIT_BUCKETS
+)
+
+# Serving
+PREDICTION_REQUEST_LATENCY = Histogram(
+    'aqi_prediction_request_latency_seconds',
+    'Latency of prediction service requests',
+    ['endpoint', 'status']
+)
+
+
+def push_metrics(job):
+    """
+    Push this process's metrics to the Pushgateway, if one is configured.
+
+    Collection and training run as short-lived cron processes, so their
+    metrics would be gone before any scrape.
+
+    :param job: Pushgateway job label
+    """
+    gateway = os.environ.get(PUSHGATEWAY_ENV)
+    if not gateway:
+        return
+    try:
+        push_to_gateway(gateway, job=job, registry=REGISTRY)
+    except Exception as e:
+        print(f"Error pushing metrics to {gateway}: {e}")
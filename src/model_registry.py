@@ -0,0 +1,167 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+
+def select_model_file(candidates):
+    """
+    First of ``candidates`` that exists, in order of preference.
+
+    :param candidates: Model paths, most preferred first
+    :return: The first existing path, or the most preferred one if none exists yet
+    """
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return candidates[0]
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the served model.
+
+    The model file is unpickled once and kept in memory. A background
+    watcher polls the file's mtime/size and, when they change, compares the
+    content hash with the loaded version before swapping the new model in.
+    Readers always see either the old or the new model, never a partial one.
+
+    Given several candidate files, every check serves the most preferred one
+    that exists, so a compact export written after startup replaces the
+    pickle without a restart.
+    """
+
+    def __init__(self, filename, poll_interval=5.0):
+        """
+        :param filename: Path to the model written by save_best_model, or a
+            sequence of candidate paths, most preferred first
+        :param poll_interval: Seconds between checks of the model file
+        """
+        self.candidates = (filename,) if isinstance(filename, str) else tuple(filename)
+        # Path of the loaded model, or the one the next load will read
+        self.filename = select_model_file(self.candidates)
+        self.poll_interval = poll_interval
+        self._current = None
+        self._stat = None
+        self._load_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """
+        Register a callback invoked with the model data after each swap.
+        """
+        self._listeners.append(callback)
+
+    @staticmethod
+    def _file_signature(filename):
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _deserialize(payload, filename):
+        # Compact exports load without statsmodels or the training data
+        if filename.endswith('.npz'):
+            from compact_model import CompactARIMA
+            model = CompactARIMA.load(io.BytesIO(payload))
+            return {**model.metadata, 'order': model.order, 'model': model}
+        
+        import joblib
+        model_data = joblib.load(io.BytesIO(payload))
+
+        # Validate model data
+        if not model_data or 'model' not in model_data:
+            raise ValueError("Invalid model data structure")
+
+        return model_data
+
+    def load(self, force=False):
+        """
+        Load the model file if it changed since the last load.
+
+        :param force: Reload even if the file signature is unchanged
+        :return: True if a new model version was swapped in
+        """
+        with self._load_lock:
+            filename = select_model_file(self.candidates)
+            signature = (filename, *self._file_signature(filename))
+            if not force and signature == self._stat:
+                return False
+
+            with open(filename, 'rb') as f:
+                payload = f.read()
+            version = hashlib.sha256(payload).hexdigest()[:12]
+
+            # Same content rewritten (e.g. touched), keep the loaded object
+            if self._current is not None and self._current['version'] == version:
+                self._stat = signature
+                return False
+
+            model_data = dict(self._deserialize(payload, filename))
+            model_data['version'] = version
+            model_data['path'] = filename
+            model_data['loaded_at'] = time.time()
+
+            # Single reference assignment, so readers swap atomically
+            self._current = model_data
+            self.filename = filename
+            self._stat = signature
+            print(f"Loaded model version {version} from {filename}")
+
+        for callback in self._listeners:
+            try:
+                callback(model_data)
+            except Exception as e:
+                print(f"Model listener error: {e}")
+        return True
+
+    def get(self):
+        """
+        Return the in-memory model data, loading it on first use.
+
+        :return: Model data dict with 'model', 'order', 'version', 'path' and 'loaded_at'
+        """
+        current = self._current
+        if current is None:
+            self.load()
+            current = self._current
+        return current
+
+    def current(self):
+        """
+        Return the in-memory model data without loading, or None.
+        """
+        return self._current
+
+    def is_loaded(self):
+        return self._current is not None
+
+    def reload_if_changed(self):
+        try:
+            return self.load()
+        except Exception as e:
+            # Keep serving the previous model if the new file is unreadable
+            print(f"Model reload error: {e}")
+            return False
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.reload_if_changed()
+
+    def start_watcher(self):
+        """
+        Start the background thread that hot-reloads the model file.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from model_registry import ModelRegistry
+
+DEFAULT_FLEET_DIR = '../models/fleet'
+DEFAULT_MAX_RESIDENT = 32
+# Versions of each model kept on disk once a newer one is saved
+DEFAULT_KEEP_VERSIONS = 3
+
+
+def model_key(city, target='aqi'):
+    """
+    Directory-safe key of the model for ``city`` and ``target``.
+    """
+    slug = re.sub(r'[^a-z0-9]+', '_', city.lower()).strip('_')
+    return f"{slug}/{target}"
+
+
+class ModelStore:
+    """
+    Versioned model artifacts indexed by city and target.
+
+    Layout: ``<root>/<city>/<target>/v000001.pkl`` plus ``<root>/index.json``
+    mapping each key to its latest version. Artifacts and the index are
+    written through a temporary file and renamed, so readers never see a
+    partial write.
+    """
+
+    INDEX_FILENAME = 'index.json'
+
+    def __init__(self, root=DEFAULT_FLEET_DIR):
+        """
+        :param root: Root directory of the store
+        """
+        self.root = root
+        self.index_path = os.path.join(root, self.INDEX_FILENAME)
+
+    def read_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def _write_index(self, index):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def save(self, city, model_data, target='aqi'):
+        """
+        Store a new version of the model for ``city``.
+
+        :param city: City name
+        :param model_data: Dict with at least 'model' and 'order'
+        :param target: Forecast target column
+        :return: New version number
+        """
+        # Write-side dependencies stay out of the serving process's imports
+        import joblib
+        from compact_model import export_compact
+
+        key = model_key(city, target)
+        index = self.read_index()
+        version = index.get(key, {}).get('version', 0) + 1
+
+        relative_path = os.path.join(key, f"v{version:06d}.pkl")
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump(model_data, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+        compact_relative_path = os.path.join(key, f"v{version:06d}.npz")
+        metadata = {k: v for k, v in model_data.items() if k not in ('model', 'order')}
+        export_compact(model_data['model'], model_data['order'],
+                       os.path.join(self.root, compact_relative_path), metadata)
+
+        index[key] = {
+            'city': city,
+            'target': target,
+            'version': version,
+            'path': relative_path,
+            'compact_path': compact_relative_path,
+            'order': list(model_data['order']),
+            'last_timestamp': model_data.get('last_timestamp'),
+            'updated_at': time.time()
+        }
+        self._write_index(index)
+        return version
+
+    def prune(self, city, target='aqi', keep=DEFAULT_KEEP_VERSIONS):
+        """
+        Delete all but the ``keep`` newest versions of the model for ``city``.
+
+        Older versions are kept around briefly so a reader holding a
+        previous index can still open the file it points to.
+
+        :return: Number of files removed
+        """
+        directory = os.path.join(self.root, model_key(city, target))
+        if not os.path.isdir(directory):
+            return 0
+        versions = sorted({name.split('.')[0] for name in os.listdir(directory)
+                           if re.fullmatch(r'v\d+\.(pkl|npz)', name)})
+        removed = 0
+        for version in versions[:-keep] if keep else versions:
+            for suffix in ('.pkl', '.npz'):
+                path = os.path.join(directory, version + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+    def path(self, city, target='aqi', index=None, compact=False):
+        """
+        Path of the latest artifact for ``city``, or None if there is none.
+
+        :param compact: Return the forecast-only .npz export when available
+        """
+        index = self.read_index() if index is None else index
+        entry = index.get(model_key(city, target))
+        if not entry:
+            return None
+        if compact and entry.get('compact_path'):
+            return os.path.join(self.root, entry['compact_path'])
+        return os.path.join(self.root, entry['path'])
+
+    def load(self, city, target='aqi'):
+        """
+        Load the latest model data for ``city``.
+        """
+        path = self.path(city, target)
+        if path is None:
+            raise KeyError(f"No model stored for {city} ({target})")
+        import joblib
+        return joblib.load(path)
+
+
+class FleetRegistry:
+    """
+    Lazily loaded per-city models with a bound on resident models.
+
+    Models are loaded on first request and kept in LRU order; once more than
+    ``max_resident`` are in memory the least recently used is dropped, so
+    memory stays flat as the city list grows. The store index is re-read
+    when it changes, and a city whose latest version moved is reloaded on
+    its next request.
+    """
+
+    def __init__(self, store, max_resident=DEFAULT_MAX_RESIDENT, poll_interval=5.0):
+        """
+        :param store: ModelStore to serve from
+        :param max_resident: Maximum number of models kept in memory
+        :param poll_interval: Minimum seconds between index checks
+        """
+        self.store = store
+        self.max_resident = max_resident
+        self.poll_interval = poll_interval
+        self._index = {}
+        self._index_stat = None
+        self._index_checked_at = 0.0
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _refresh_index(self):
+        now = time.monotonic()
+        if now - self._index_checked_at < self.poll_interval:
+            return
+        self._index_checked_at = now
+        try:
+            stat = os.stat(self.store.index_path)
+        except FileNotFoundError:
+            self._index = {}
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._index_stat:
+            self._index = self.store.read_index()
+            self._index_stat = signature
+
+    def has_model(self, city, target='aqi'):
+        with self._lock:
+            self._refresh_index()
+            return model_key(city, target) in self._index
+
+    def get(self, city, target='aqi'):
+        """
+        Model data for ``city``, or None if the store has no model for it.
+
+        :return: Model data dict as returned by ModelRegistry.get
+        """
+        key = model_key(city, target)
+        with self._lock:
+            self._refresh_index()
+            path = self.store.path(city, target, self._index, compact=True)
+            if path is None:
+                return None
+
+            registry = self._resident.get(key)
+            if registry is None or registry.filename != path:
+                registry = ModelRegistry(path)
+                self._resident[key] = registry
+            self._resident.move_to_end(key)
+
+            while len(self._resident) > self.max_resident:
+                self._resident.popitem(last=False)
+
+        # Unpickling happens outside the fleet lock
+        return registry.get()
+
+    def resident_count(self):
+        return len(self._resident)
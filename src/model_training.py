@@ -1,24 +1,256 @@
+import argparse
+import os
+import time
 import numpy as np
+import pandas as pd
 import joblib
 import mlflow
 import mlflow.sklearn
+from mlflow.tracking import MlflowClient
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 from statsmodels.tsa.arima.model import ARIMA
 import warnings
-from data_preprocessing import DataLoader, preprocess_data
+from data_preprocessing import (PARQUET_DATA_DIR, RAW_DATA_DIR, DataLoader, fit_cleaning_params,
+                                parse_timestamps, preprocess_data, save_cleaning_params)
+from arima_search import (DEFAULT_FIT_TIMEOUT, parallel_grid_search, select_differencing,
+                          stepwise_search)
+from backtesting import DEFAULT_HORIZONS, backtest_orders, log_backtest, ranked_orders
+from compact_model import export_compact
+from accuracy_tracker import step_interval
+from metrics import ARIMA_FIT_DURATION, push_metrics
+from streaming_preprocessing import list_csv_files, stream_target_series
 import itertools
 
 warnings.filterwarnings("ignore")
 
+TRACKING_MODES = ('batched', 'nested')
+SEARCH_MODES = ('grid', 'stepwise', 'backtest')
 
-def train_arima_model(data, order=(1,1,1), tune_hyperparameters=True):
+
+class CandidateTracker:
+    """
+    Records the per-candidate results of an order search in MLflow.
+    
+    'nested' opens one nested run per candidate. 'batched' keeps the results
+    in memory and flush() writes them as a single CSV artifact of the active
+    run, so a search costs one write however many candidates it fits.
+    """
+    
+    def __init__(self, mode='batched'):
+        if mode not in TRACKING_MODES:
+            raise ValueError(f"Unsupported tracking mode: {mode}")
+        self.mode = mode
+        self.rows = []
+    
+    def log(self, params, metrics=None, error=None):
+        """
+        Args:
+            params (dict): Candidate parameters, e.g. the ARIMA order
+            metrics (dict, optional): Candidate scores
+            error (str, optional): Why the candidate failed
+        """
+        if self.mode == 'batched':
+            self.rows.append({**params, **(metrics or {}), 'error': error})
+            return
+        
+        with mlflow.start_run(nested=True):
+            if error:
+                mlflow.log_param('error', error)
+                return
+            mlflow.log_params(params)
+            mlflow.log_metrics(metrics or {})
+    
+    def flush(self, artifact_file='candidates.csv'):
+        if self.rows:
+            mlflow.log_text(pd.DataFrame(self.rows).to_csv(index=False), artifact_file)
+            self.rows = []
+
+
+def log_best_model(model, artifact_path, tracking='batched'):
+    """
+    Serialize the selected model into the active run in 'nested' mode.
+    
+    In 'batched' mode nothing is written here; the model is logged once,
+    as the file save_best_model wrote, by log_saved_model.
+    """
+    if tracking == 'nested':
+        mlflow.sklearn.log_model(model, artifact_path)
+
+
+def log_saved_model(filename, artifact_path='model'):
+    """
+    Attach a saved model file to the most recent training run.
+    
+    Args:
+        filename (str): Path returned by save_best_model
+        artifact_path (str, optional): Artifact directory within the run
+    """
+    run = mlflow.last_active_run()
+    if run is None or filename is None:
+        return
+    MlflowClient().log_artifact(run.info.run_id, filename, artifact_path)
+
+
+def train_stepwise_arima_model(train, test, criterion='aic', seasonal_period=0,
+                               n_jobs=None, fit_timeout=DEFAULT_FIT_TIMEOUT, tracking='batched'):
+    """
+    Select an ARIMA order by stepwise information-criterion search and score it on the test split.
+    
+    Args:
+        train (pandas.Series): Training split
+        test (pandas.Series): Test split
+        criterion (str, optional): 'aic' or 'bic'
+        seasonal_period (int, optional): Season length m, 0 for a non-seasonal search
+        n_jobs (int, optional): Worker processes for each search round
+        fit_timeout (float, optional): Seconds before a single candidate fit is abandoned
+        tracking (str, optional): 'batched' or 'nested', see CandidateTracker
+    
+    Returns:
+        tuple: Best model, best predictions, best test data, and best parameters
+    """
+    tracker = CandidateTracker(tracking)
+    with mlflow.start_run(run_name="ARIMA_Stepwise_Search"):
+        # Differencing is chosen by unit-root tests instead of being searched
+        d = select_differencing(train)
+        mlflow.log_params({
+            'search': 'stepwise',
+            'criterion': criterion,
+            'selected_d': d,
+            'seasonal_period': seasonal_period
+        })
+        
+        best = None
+        for result in stepwise_search(train, d, seasonal_period=seasonal_period, criterion=criterion,
+                                      n_jobs=n_jobs, fit_timeout=fit_timeout):
+            param = result['order']
+            ARIMA_FIT_DURATION.labels(order=str(param)).observe(result['fit_time'])
+            params = {
+                'arima_p': param[0],
+                'arima_d': param[1],
+                'arima_q': param[2],
+                'seasonal_order': result['seasonal_order']
+            }
+            
+            if result['error']:
+                tracker.log(params, {'fit_time_seconds': result['fit_time']}, result['error'])
+                print(f"Error with parameters {param}{result['seasonal_order']}: {result['error']}")
+                continue
+            
+            tracker.log(params, {
+                'aic': result['aic'],
+                'bic': result['bic'],
+                'fit_time_seconds': result['fit_time']
+            })
+            
+            if best is None or result[criterion] < best[criterion]:
+                best = result
+        
+        tracker.flush()
+        if best is None:
+            raise ValueError("No valid ARIMA model configuration found during stepwise search.")
+        
+        # Only the selected order is forecast over the test split
+        best_model = best['model']
+        predictions = best_model.forecast(steps=len(test))
+        rmse = np.sqrt(mean_squared_error(test, predictions))
+        
+        mlflow.log_params({
+            'best_arima_order': best['order'],
+            'best_seasonal_order': best['seasonal_order']
+        })
+        mlflow.log_metrics({
+            f'best_{criterion}': best[criterion],
+            'best_rmse': rmse,
+            'best_mae': mean_absolute_error(test, predictions)
+        })
+        log_best_model(best_model, 'best_arima_model', tracking)
+        
+        return best_model, predictions, test, best['order']
+
+def train_backtest_arima_model(data, train_size, orders, horizons=DEFAULT_HORIZONS, refit_every=None,
+                               n_jobs=None, fit_timeout=DEFAULT_FIT_TIMEOUT, tracking='batched'):
+    """
+    Select an ARIMA order by walk-forward backtest and score it on the test split.
+    
+    Forecast origins run over the test split, so each order is judged on the
+    horizons the service serves instead of one len(test)-step forecast.
+    
+    Args:
+        data (pandas.Series): Full series; the first train_size values are the training split
+        train_size (int): Size of the training split and first forecast origin
+        orders (list): Candidate (p,d,q) orders
+        horizons (tuple, optional): Steps ahead to score; the order is chosen on the first
+        refit_every (int, optional): Origins between refits, None to fit each order once
+        n_jobs (int, optional): Worker processes for the backtest
+        fit_timeout (float, optional): Seconds before a single fold fit is abandoned
+        tracking (str, optional): 'batched' or 'nested', decides how the model is logged
+    
+    Returns:
+        tuple: Best model, best predictions, best test data, and best parameters
+    """
+    train, test = data[:train_size], data[train_size:]
+    
+    with mlflow.start_run(run_name="ARIMA_Backtest_Search"):
+        table = backtest_orders(data, orders, train_size, horizons, refit_every,
+                                n_jobs=n_jobs, fit_timeout=fit_timeout)
+        
+        ranked = ranked_orders(table, horizons[0])
+        if not ranked:
+            raise ValueError("No valid ARIMA model configuration found during backtesting.")
+        
+        # Refit on the training split with the same iteration and time limits
+        # as every other candidate fit; an order scored on later folds only
+        # may not converge there, so the next best one is tried
+        best = None
+        for order in ranked:
+            result = next(parallel_grid_search(train, test, [order], n_jobs=1, fit_timeout=fit_timeout))
+            ARIMA_FIT_DURATION.labels(order=str(order)).observe(result['fit_time'])
+            if not result['error']:
+                best = order
+                break
+            print(f"Error refitting backtested order {order}: {result['error']}")
+        if best is None:
+            raise ValueError("No backtested ARIMA order could be refitted on the training split.")
+        
+        log_backtest(table, {
+            'search': 'backtest',
+            'horizons': list(horizons),
+            'refit_every': refit_every
+        }, best)
+        
+        best_model = result['model']
+        predictions = result['predictions']
+        mlflow.log_metrics({
+            'best_rmse': result['rmse'],
+            'best_mae': result['mae']
+        })
+        log_best_model(best_model, 'best_arima_model', tracking)
+        
+        return best_model, predictions, test, best
+
+def train_arima_model(data, order=(1,1,1), tune_hyperparameters=True,
+                      n_jobs=None, fit_timeout=DEFAULT_FIT_TIMEOUT, search='grid',
+                      criterion='aic', seasonal_period=0, horizons=DEFAULT_HORIZONS,
+                      refit_every=None, tracking='batched'):
     """
     Train ARIMA model with optional hyperparameter tuning and MLflow tracking.
     
     Args:
         data (pandas.Series): Time series AQI data
-        order (tuple, optional): Initial ARIMA model order (p,d,q)
+        order (tuple, optional): ARIMA model order (p,d,q), used when not tuning
         tune_hyperparameters (bool, optional): Whether to perform grid search
+        n_jobs (int, optional): Worker processes for the grid search, defaults to the CPU count
+        fit_timeout (float, optional): Seconds before a single candidate fit is abandoned
+        search (str, optional): 'grid' for the exhaustive grid, 'stepwise' for an
+            information-criterion driven search over a larger space, or 'backtest'
+            to score the grid by walk-forward forecasts over the test split
+        criterion (str, optional): 'aic' or 'bic', used by the stepwise search
+        seasonal_period (int, optional): Season length for the stepwise search, 0 for none
+        horizons (tuple, optional): Steps ahead scored by the backtest search
+        refit_every (int, optional): Forecast origins between refits in the backtest search
+        tracking (str, optional): 'batched' to write all candidate results as one
+            artifact when the search ends and leave model logging to log_saved_model,
+            or 'nested' for one nested run per candidate and an MLflow model per search
     
     Returns:
         tuple: Best model, best predictions, best test data, and best parameters
@@ -27,6 +259,10 @@ def train_arima_model(data, order=(1,1,1), tune_hyperparameters=True):
     train_size = int(len(data) * 0.8)
     train, test = data[:train_size], data[train_size:]
     
+    if tune_hyperparameters and search == 'stepwise':
+        return train_stepwise_arima_model(train, test, criterion, seasonal_period,
+                                          n_jobs, fit_timeout, tracking)
+    
     # Hyperparameter tuning configuration
     if tune_hyperparameters:
         # Define hyperparameter search space
@@ -37,61 +273,61 @@ def train_arima_model(data, order=(1,1,1), tune_hyperparameters=True):
         # Generate all possible parameter combinations
         pdq = list(itertools.product(p, d, q))
         
+        if search == 'backtest':
+            return train_backtest_arima_model(data, train_size, pdq, horizons, refit_every,
+                                              n_jobs, fit_timeout, tracking)
+        
         # Track best model and metrics
         best_rmse = float('inf')
         best_model = None
         best_predictions = None
         best_order = None
+        tracker = CandidateTracker(tracking)
         
         # Main MLflow run to track overall hyperparameter tuning
         with mlflow.start_run(run_name="ARIMA_Hyperparameter_Tuning"):
-            # Grid search through different ARIMA configurations
-            for param in pdq:
-                # Create a nested run for each parameter configuration
-                with mlflow.start_run(nested=True):
-                    try:
-                        # Train model with current parameters
-                        model = ARIMA(train, order=param)
-                        model_fit = model.fit()
-                        
-                        # Make predictions
-                        predictions = model_fit.forecast(steps=len(test))
-                        
-                        # Calculate metrics
-                        mse = mean_squared_error(test, predictions)
-                        rmse = np.sqrt(mse)
-                        mae = mean_absolute_error(test, predictions)
-                        
-                        # Log parameters for this specific run
-                        mlflow.log_params({
-                            'arima_p': param[0],
-                            'arima_d': param[1],
-                            'arima_q': param[2]
-                        })
-                        
-                        # Log metrics for this run
-                        mlflow.log_metrics({
-                            'rmse': rmse,
-                            'mae': mae
-                        })
-                        
-                        # Update best model if current model performs better
-                        if rmse < best_rmse:
-                            best_rmse = rmse
-                            best_model = model_fit
-                            best_predictions = predictions
-                            best_order = param
-                    
-                    except Exception as e:
-                        # Log the error for the specific parameter configuration
-                        mlflow.log_param('error', str(e))
-                        print(f"Error with parameters {param}: {e}")
+            mlflow.log_param('n_jobs', n_jobs or os.cpu_count())
+            
+            # Candidates are fitted in worker processes; results are
+            # logged here as they complete
+            for result in parallel_grid_search(train, test, pdq, n_jobs, fit_timeout):
+                param = result['order']
+                # Fit times are measured in the workers and observed here,
+                # since worker processes do not share the parent's registry
+                ARIMA_FIT_DURATION.labels(order=str(param)).observe(result['fit_time'])
+                params = {
+                    'arima_p': param[0],
+                    'arima_d': param[1],
+                    'arima_q': param[2]
+                }
+                
+                if result['error']:
+                    # Log the error for the specific parameter configuration
+                    tracker.log(params, {'fit_time_seconds': result['fit_time']}, result['error'])
+                    print(f"Error with parameters {param}: {result['error']}")
+                    continue
+                
+                rmse = result['rmse']
+                tracker.log(params, {
+                    'rmse': rmse,
+                    'mae': result['mae'],
+                    'fit_time_seconds': result['fit_time']
+                })
+                
+                # Update best model if current model performs better
+                if rmse < best_rmse:
+                    best_rmse = rmse
+                    best_model = result['model']
+                    best_predictions = result['predictions']
+                    best_order = param
+            
+            tracker.flush()
             
             # Log the best model details in the main run
             if best_model:
                 mlflow.log_param('best_arima_order', best_order)
                 mlflow.log_metric('best_rmse', best_rmse)
-                mlflow.sklearn.log_model(best_model, 'best_arima_model')
+                log_best_model(best_model, 'best_arima_model', tracking)
                 
                 return best_model, best_predictions, test, best_order
         
@@ -119,7 +355,7 @@ def train_arima_model(data, order=(1,1,1), tune_hyperparameters=True):
             mlflow.log_metric('test_mae', mae)
             
             # Log model
-            mlflow.sklearn.log_model(model_fit, 'arima_model')
+            log_best_model(model_fit, 'arima_model', tracking)
             
             return model_fit, predictions, test, order
 
@@ -127,13 +363,24 @@ def train_arima_model(data, order=(1,1,1), tune_hyperparameters=True):
 # data = pd.Series(...)  # Your time series data
 # best_model, best_predictions, test_data, best_order = train_arima_model(data)
     
-def save_best_model(model, order, filename='../models/model.pkl'):
+def residual_rmse(model):
+    """
+    In-sample one-step-ahead RMSE, the baseline for drift detection.
+    """
+    # Residuals during the diffuse initialisation are not informative
+    burn = getattr(model, 'loglikelihood_burn', 0)
+    residuals = np.asarray(model.resid)[burn:]
+    return float(np.sqrt(np.mean(residuals ** 2)))
+
+def save_best_model(model, order, filename='../models/model.pkl', metadata=None):
     """
     Save the best ARIMA model to a pickle file.
     
     Args:
         model: Trained ARIMA model
         filename (str): Filename to save the model
+        metadata (dict, optional): Extra entries stored with the model, e.g.
+            training time and the last observed timestamp
     
     Returns:
         str: Path to the saved model
@@ -142,62 +389,155 @@ def save_best_model(model, order, filename='../models/model.pkl'):
         # Extract model parameters and results
         model_data = {
             'order': order,
-            'model': model
+            'model': model,
+            **(metadata or {})
         }
         
-        # Save the model
-        joblib.dump(model_data, filename)
+        # Write to a temporary file and rename it into place so the
+        # prediction service's hot reload never sees a partial pickle
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        tmp_filename = f"{filename}.tmp"
+        joblib.dump(model_data, tmp_filename)
+        os.replace(tmp_filename, filename)
         print(f"Model saved successfully to {filename}")
+        
+        # Forecast-only export that the prediction service loads in milliseconds
+        compact_filename = f"{os.path.splitext(filename)[0]}.npz"
+        export_compact(model, order, compact_filename, metadata)
+        print(f"Compact model saved successfully to {compact_filename}")
         return filename
     except Exception as e:
         print(f"Error saving model: {e}")
         return None
 
-def main():
+def load_training_frame(raw_data_dir=RAW_DATA_DIR, parquet_data_dir=PARQUET_DATA_DIR, start=None):
+    """
+    Load the collected rows training reads, preferring the Parquet store when it has data.
+    
+    Args:
+        raw_data_dir (str): Directory of raw collection CSVs
+        parquet_data_dir (str): Root of the Parquet store
+        start (optional): Inclusive lower bound on timestamp
+    
+    Returns:
+        pandas.DataFrame: Uncleaned rows; empty when none are newer than start
+    """
+    if os.path.isdir(parquet_data_dir) and os.listdir(parquet_data_dir):
+        try:
+            df = DataLoader.load_from_store(
+                parquet_data_dir,
+                columns=['city', 'timestamp', 'temperature', 'humidity', 'wind_speed', 'aqi',
+                         'co', 'no', 'no2', 'o3', 'so2', 'pm2_5', 'pm10'],
+                start=start
+            )
+        except ValueError:
+            if start is None:
+                raise
+            return pd.DataFrame(columns=['timestamp', 'aqi'])
+        return df.sort_values('timestamp', kind='stable')
+    
+    df = DataLoader.load_all_csv_files(raw_data_dir, cache_dir='../data/cache/')
+    if start is not None:
+        df = df[parse_timestamps(df['timestamp']) >= pd.Timestamp(start)]
+    return df
+
+def load_training_series(raw_data_dir=RAW_DATA_DIR, parquet_data_dir=PARQUET_DATA_DIR, streaming=False):
+    """
+    Load, clean and select the AQI training series.
+    
+    Args:
+        raw_data_dir (str): Directory of raw collection CSVs
+        parquet_data_dir (str): Root of the Parquet store, preferred when it has data
+        streaming (bool, optional): Preprocess the CSVs chunk by chunk with
+            bounded memory instead of loading them into one frame
+    
+    Returns:
+        tuple: AQI series with a RangeIndex, the timestamp of its last observation,
+            and the seconds per series step (None if the series has no fixed step)
+    """
+    if streaming:
+        files = list_csv_files(raw_data_dir)
+        if not files:
+            raise ValueError(f"No CSV files found in {raw_data_dir}")
+        aqi_data, cleaning_params, last_timestamp = stream_target_series(files)
+        save_cleaning_params(cleaning_params)
+        # Row times are not kept while streaming
+        return aqi_data, last_timestamp, None
+    
+    # Load and preprocess data, preferring the Parquet store when present
+    df = load_training_frame(raw_data_dir, parquet_data_dir)
+    
+    # Preprocess the data
+    # Fitted medians and bounds are kept for incremental updates
+    cleaning_params = fit_cleaning_params(df)
+    save_cleaning_params(cleaning_params)
+    df_processed = preprocess_data(df, cleaning_params)
+    
+    # Feature engineering
+    #df_engineered = feature_engineering(df_processed)
+    
+    # Select target variable; a RangeIndex lets the saved results
+    # object be extended with new observations later on
+    aqi_data = df_processed['aqi'].reset_index(drop=True)
+    timestamps = parse_timestamps(df_processed['timestamp'])
+    return aqi_data, timestamps.max(), step_interval(timestamps)
+
+def main(streaming=False, tracking='batched', search='grid', criterion='aic', seasonal_period=0,
+         horizons=DEFAULT_HORIZONS, refit_every=None):
     # Set up MLflow tracking
     #mlflow.set_tracking_uri('file:///mlruns')
     mlflow.set_experiment('aqi_prediction')
     
-    # Load and preprocess data
-    raw_data_dir = '../data/raw/'
-    df = DataLoader.load_all_csv_files(raw_data_dir)
+    aqi_data, last_timestamp, step_seconds = load_training_series(RAW_DATA_DIR, PARQUET_DATA_DIR, streaming)
     
-    if df is not None:
-        # Preprocess the data
-        df_processed = preprocess_data(df)
-        
-        # Feature engineering
-        #df_engineered = feature_engineering(df_processed)
+    if len(aqi_data):
+        best_model, predictions, test, best_order = train_arima_model(
+            aqi_data, search=search, criterion=criterion, seasonal_period=seasonal_period,
+            horizons=tuple(horizons), refit_every=refit_every, tracking=tracking)
+        best_rmse = np.sqrt(mean_squared_error(test, predictions))
         
-        # Select target variable
-        aqi_data = df_processed['aqi']
+        print(f"Best ARIMA Model Order: {best_order}")
+        print(f"Best RMSE: {best_rmse}")
         
-        # Try multiple ARIMA model orders
-        orders_to_try = [
-            (1,1,1),
-            (1,0,1),
-            (2,1,2)
-        ]
+        # Absorb the test split without refitting so forecasts start
+        # from the latest observation
+        best_model = best_model.append(test, refit=False)
         
-        best_model = None
-        best_order = None
-        best_rmse = float('inf')
+        now = time.time()
+        saved = save_best_model(best_model, best_order, metadata={
+            'trained_at': now,
+            'updated_at': now,
+            'last_timestamp': str(last_timestamp),
+            'step_seconds': step_seconds,
+            'baseline_rmse': residual_rmse(best_model)
+        })
         
-        for order in orders_to_try:
-            model, predictions, test, order = train_arima_model(aqi_data, order)
-            
-            rmse = np.sqrt(mean_squared_error(test, predictions))
-            
-            if rmse < best_rmse:
-                best_rmse = rmse
-                best_model = model
-                best_order = order
-        
-        print(f"Best ARIMA Model Order: {best_order}")
-        print(f"Best RMSE: {best_rmse}")
-        save_best_model(best_model, best_order)
+        # The deployed pickle is the only copy of the model the run keeps
+        if tracking == 'batched':
+            log_saved_model(saved)
     else:
         print("Failed to load and process data.")
+    
+    push_metrics('model_training')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the AQI forecasting model")
+    parser.add_argument('--streaming', action='store_true',
+                        help="preprocess raw CSVs chunk by chunk with bounded memory")
+    parser.add_argument('--tracking', choices=TRACKING_MODES, default='batched',
+                        help="'batched' writes candidate results as one artifact, "
+                             "'nested' opens an MLflow run per candidate")
+    parser.add_argument('--search', choices=SEARCH_MODES, default='grid',
+                        help="'grid' scores every order on the test split, 'stepwise' searches "
+                             "by information criterion, 'backtest' scores the grid walk-forward")
+    parser.add_argument('--criterion', choices=('aic', 'bic'), default='aic',
+                        help="information criterion of the stepwise search")
+    parser.add_argument('--seasonal-period', type=int, default=0,
+                        help="season length of the stepwise search, 0 for none")
+    parser.add_argument('--horizons', type=int, nargs='+', default=list(DEFAULT_HORIZONS),
+                        help="steps ahead scored by the backtest; the order is chosen on the first")
+    parser.add_argument('--refit-every', type=int, default=None,
+                        help="forecast origins between backtest refits; by default each order is fitted once")
+    args = parser.parse_args()
+    main(streaming=args.streaming, tracking=args.tracking, search=args.search, criterion=args.criterion,
+         seasonal_period=args.seasonal_period, horizons=args.horizons, refit_every=args.refit_every)
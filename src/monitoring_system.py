@@ -1,35 +1,36 @@
-from prometheus_client import start_http_server, Gauge, Counter
-from prometheus_client import PLATFORM_COLLECTOR, PROCESS_COLLECTOR, GC_COLLECTOR
+from prometheus_client import start_http_server, Gauge, Counter, Histogram
+from prometheus_client import PLATFORM_COLLECTOR, PROCESS_COLLECTOR, GC_COLLECTOR, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+import argparse
+import asyncio
+import os
 import time
-import random
 import requests
-import threading
+from accuracy_tracker import DEFAULT_STATE_PATH, AccuracyTracker, summarize
+from api_client import build_session
 
 # Disable default collectors to reduce noise
 PLATFORM_COLLECTOR.collect = lambda: []
 PROCESS_COLLECTOR.collect = lambda: []
 GC_COLLECTOR.collect = lambda: []
 
-# Metrics for Data Ingestion
-DATA_INGESTION_LATENCY = Gauge(
-    'environmental_data_ingestion_latency_seconds', 
-    'Latency of data ingestion from different sources',
-    ['source']
-)
-DATA_INGESTION_VOLUME = Counter(
-    'environmental_data_ingestion_volume_total', 
-    'Total volume of data ingested from different sources',
-    ['source']
-)
+DEFAULT_API_URL = 'http://localhost:8000/prediction'
+DEFAULT_METRICS_PORT = 9000
+DEFAULT_PROBE_RATE_PER_MINUTE = 0
+DEFAULT_PROBE_TIMEOUT = (1.0, 5.0)
+
+# Ingestion, preprocessing and training metrics are recorded where the work
+# happens (see metrics.py); this prober only measures the prediction API
+# from the outside
 
 # Metrics for Model Prediction
-MODEL_PREDICTION_LATENCY = Gauge(
+MODEL_PREDICTION_LATENCY = Histogram(
     'aqi_prediction_latency_seconds', 
-    'Latency of AQI prediction'
+    'End-to-end latency of AQI prediction requests made by the prober'
 )
-MODEL_PREDICTION_ACCURACY = Gauge(
-    'aqi_prediction_accuracy_percentage', 
-    'Accuracy of AQI predictions'
+MODEL_PREDICTED_AQI = Gauge(
+    'aqi_predicted_value', 
+    'Latest AQI value returned by the prediction API'
 )
 
 # Metrics for API Performance
@@ -42,75 +43,131 @@ API_ERROR_COUNTER = Counter(
     'Total number of API errors'
 )
 
+class ForecastAccuracyCollector:
+    """
+    Exposes the rolling accuracy kept by AccuracyTracker.
+    
+    The tracker's state file is read on each scrape, so the values follow
+    the latest scoring run without a polling thread.
+    """
+    
+    METRICS = (
+        ('mae', 'aqi_forecast_mae', 'Rolling mean absolute error of served forecasts'),
+        ('rmse', 'aqi_forecast_rmse', 'Rolling root mean squared error of served forecasts'),
+        ('coverage', 'aqi_forecast_interval_coverage', 'Rolling share of observations inside the served interval'),
+        ('nominal_coverage', 'aqi_forecast_nominal_coverage', 'Rolling mean nominal coverage (1 - alpha) of served intervals'),
+        ('count', 'aqi_forecast_scored_predictions', 'Number of served forecasts scored against observations')
+    )
+    
+    def __init__(self, state_path=DEFAULT_STATE_PATH):
+        self.tracker = AccuracyTracker(state_path=state_path)
+    
+    def collect(self):
+        families = {
+            key: GaugeMetricFamily(name, documentation, labels=['scope', 'horizon'])
+            for key, name, documentation in self.METRICS
+        }
+        try:
+            state = self.tracker.load_state()
+        except (OSError, ValueError) as e:
+            print(f"Accuracy state read error: {e}")
+            state = {'stats': {}}
+        
+        for scope, horizons in state['stats'].items():
+            for horizon, stats in horizons.items():
+                summary = summarize(stats)
+                if summary is None:
+                    continue
+                for key, family in families.items():
+                    family.add_metric([scope, horizon], summary[key])
+        return list(families.values())
+
 class EnvironmentalMonitoring:
-    def __init__(self, api_url):
+    """
+    Serves forecast-accuracy metrics and optionally probes the prediction API.
+    
+    The service reports its own request latency on /metrics, so the prober
+    is off by default and only adds an outside view at a low, fixed rate.
+    Probes run on an asyncio loop over one keep-alive session; each request
+    runs in a worker thread and the next one is not started before it ends.
+    """
+    
+    def __init__(self, api_url, probe_rate_per_minute=DEFAULT_PROBE_RATE_PER_MINUTE,
+                 timeout=DEFAULT_PROBE_TIMEOUT, port=DEFAULT_METRICS_PORT):
+        """
+        :param api_url: Prediction endpoint to probe
+        :param probe_rate_per_minute: Probes per minute, 0 disables the prober
+        :param timeout: Requests (connect, read) timeout of a probe in seconds
+        :param port: Port of the Prometheus metrics server
+        """
         self.api_url = api_url
+        self.probe_rate_per_minute = probe_rate_per_minute
+        self.timeout = timeout
+        self.port = port
+        self.session = build_session(pool_size=1)
     
-    def simulate_data_ingestion(self):
-        while True:
+    def probe(self):
+        API_REQUEST_COUNTER.inc()
+        start_time = time.perf_counter()
+        try:
+            response = self.session.post(self.api_url, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            API_ERROR_COUNTER.inc()
+            print(f"API Request Error: {e}")
+            return
+        
+        MODEL_PREDICTION_LATENCY.observe(time.perf_counter() - start_time)
+        if response.status_code == 200:
+            # A malformed body counts as a failed probe instead of ending the event loop
             try:
-                sources = ['OpenWeatherMap', 'AirVisual']
-                for source in sources:
-                    start_time = time.time()
-                    
-                    time.sleep(random.uniform(0.1, 1.0))
-                    
-                    latency = time.time() - start_time
-                    DATA_INGESTION_LATENCY.labels(source=source).set(latency)
-                    DATA_INGESTION_VOLUME.labels(source=source).inc(random.randint(100, 1000))
-            
-            except Exception as e:
-                print(f"Data ingestion error: {e}")
-            
-            time.sleep(5)
+                MODEL_PREDICTED_AQI.set(response.json().get('predicted_aqi', 0))
+            except (ValueError, TypeError, AttributeError) as e:
+                API_ERROR_COUNTER.inc()
+                print(f"API Response Error: {e}")
+        else:
+            API_ERROR_COUNTER.inc()
+            print(f"API Error: {response.status_code}")
     
-    def monitor_api_performance(self):
+    async def run_prober(self):
+        interval = 60.0 / self.probe_rate_per_minute
+        loop = asyncio.get_running_loop()
+        next_probe = loop.time()
         while True:
-            try:
-                API_REQUEST_COUNTER.inc()
-                
-                start_time = time.time()
-                response = requests.post(self.api_url)
-                
-                latency = time.time() - start_time
-                MODEL_PREDICTION_LATENCY.set(latency)
-                
-                if response.status_code == 200:
-                    prediction = response.json().get('predicted_aqi', 0)
-                    print(f"Predicted AQI: {prediction}")
-                    MODEL_PREDICTION_ACCURACY.set(prediction)
-                else:
-                    API_ERROR_COUNTER.inc()
-                    print(f"API Error: {response.status_code}")
-            
-            except requests.exceptions.RequestException as e:
-                API_ERROR_COUNTER.inc()
-                print(f"API Request Error: {e}")
-            
-            time.sleep(5)
+            await asyncio.to_thread(self.probe)
+            # Slow probes push the schedule back instead of causing a burst
+            next_probe = max(next_probe + interval, loop.time())
+            await asyncio.sleep(next_probe - loop.time())
+    
+    async def run(self):
+        if self.probe_rate_per_minute > 0:
+            await self.run_prober()
+        else:
+            await asyncio.Event().wait()
     
     def start_monitoring(self):
         # Start Prometheus metrics server
-        start_http_server(9000)
-        
-        # Create and start monitoring threads
-        data_ingestion_thread = threading.Thread(target=self.simulate_data_ingestion, daemon=True)
-        api_monitor_thread = threading.Thread(target=self.monitor_api_performance, daemon=True)
+        REGISTRY.register(ForecastAccuracyCollector())
+        start_http_server(self.port)
         
-        data_ingestion_thread.start()
-        api_monitor_thread.start()
-        
-        # Keep main thread running
         try:
-            while True:
-                time.sleep(1)
+            asyncio.run(self.run())
         except KeyboardInterrupt:
             print("Stopping monitoring...")
 
 def main():
-    API_URL = 'http://localhost:8000/prediction'
-    monitor = EnvironmentalMonitoring(API_URL)
+    parser = argparse.ArgumentParser(description="Serve forecast accuracy metrics and probe the prediction API")
+    parser.add_argument('--api-url', default=os.environ.get('MONITORING_API_URL', DEFAULT_API_URL))
+    parser.add_argument('--probe-rate', type=float,
+                        default=float(os.environ.get('MONITORING_PROBE_RATE_PER_MINUTE', DEFAULT_PROBE_RATE_PER_MINUTE)),
+                        help="synthetic probes per minute, 0 disables the prober")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_PROBE_TIMEOUT[1],
+                        help="read timeout of a probe in seconds")
+    parser.add_argument('--port', type=int, default=DEFAULT_METRICS_PORT)
+    args = parser.parse_args()
+    
+    monitor = EnvironmentalMonitoring(args.api_url, args.probe_rate,
+                                      (DEFAULT_PROBE_TIMEOUT[0], args.timeout), args.port)
     monitor.start_monitoring()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
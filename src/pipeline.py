@@ -0,0 +1,252 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from data_preprocessing import PARQUET_DATA_DIR, RAW_DATA_DIR
+from model_registry import select_model_file
+
+STATE_PATH = '../data/pipeline_state.json'
+CLEANING_PARAMS_PATH = '../models/cleaning_params.json'
+MODEL_PATH = '../models/model.pkl'
+COMPACT_MODEL_PATH = '../models/model.npz'
+SERVICE_URL = 'http://localhost:8000'
+
+# The model update is skipped until at least this many rows arrived since it last ran
+DEFAULT_MIN_NEW_ROWS = 24
+
+# Seconds to wait for the service to hot-reload a new model
+HANDOFF_TIMEOUT = 60
+SERVICE_START_TIMEOUT = 30
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def count_rows(path):
+    """
+    Rows in a CSV or Parquet data file, without parsing the values.
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_metadata(path).num_rows
+    with open(path, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def scan_data_files(previous=None, directories=(RAW_DATA_DIR, PARQUET_DATA_DIR)):
+    """
+    Fingerprint and row count of every training data file.
+
+    Rows are only counted for files whose fingerprint changed since
+    ``previous``, so a scan costs one stat per unchanged file.
+
+    :param previous: Files mapping from an earlier scan
+    :return: Dict mapping path to [fingerprint, rows]
+    """
+    from data_preprocessing import DataLoader
+
+    previous = previous or {}
+    files = {}
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for root, dirnames, filenames in os.walk(directory):
+            # Dot-prefixed entries are in-progress writes (see ParquetStore.compact)
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith('.'))
+            for name in sorted(filenames):
+                if name.startswith('.') or not name.endswith(('.csv', '.parquet')):
+                    continue
+                path = os.path.join(root, name)
+                fingerprint = DataLoader.file_fingerprint(path)
+                known = previous.get(path)
+                rows = known[1] if known and known[0] == fingerprint else count_rows(path)
+                files[path] = [fingerprint, rows]
+    return files
+
+
+def inputs_hash(files, extra_paths=(CLEANING_PARAMS_PATH,)):
+    """
+    Content hash of a stage's inputs: data file fingerprints plus the
+    contents of ``extra_paths`` that exist.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(f"{path}\0{files[path][0]}\n".encode())
+    for path in extra_paths:
+        if os.path.exists(path):
+            digest.update(f"{path}\0{file_sha256(path)}\n".encode())
+    return digest.hexdigest()
+
+
+def run_collect():
+    """
+    Collect one batch of observations; DVC versioning is queued, not awaited.
+    """
+    import data_collection
+    return data_collection.main()
+
+
+def run_update(state, min_new_rows=DEFAULT_MIN_NEW_ROWS, force=False):
+    """
+    Update the model unless its inputs are unchanged or grew too little.
+
+    :param state: Pipeline state, updated in place when the stage runs
+    :param min_new_rows: Minimum data delta, in rows, that triggers an update
+    :param force: Run regardless of the inputs
+    :return: True if the model stage ran
+    """
+    stage = state.get('update', {})
+    files = scan_data_files(stage.get('files'))
+    current_hash = inputs_hash(files)
+    rows = sum(entry[1] for entry in files.values())
+    new_rows = rows - stage.get('rows', 0)
+
+    if not force and os.path.exists(MODEL_PATH):
+        if current_hash == stage.get('inputs_hash'):
+            print("Model update skipped: inputs unchanged")
+            return False
+        if new_rows < min_new_rows:
+            # State is left as is so the delta keeps accumulating
+            print(f"Model update skipped: {new_rows} new rows, threshold {min_new_rows}")
+            return False
+
+    import incremental_update
+
+    start_time = time.time()
+    incremental_update.main()
+    print(f"Model stage finished in {time.time() - start_time:.1f}s ({new_rows} new rows)")
+
+    # Training may rewrite the cleaning parameters, so hash again
+    state['update'] = {
+        'inputs_hash': inputs_hash(files),
+        'files': files,
+        'rows': rows,
+        'completed_at': time.time()
+    }
+    return True
+
+
+def served_model_path():
+    # Same preference the service's registry applies on every reload check
+    return select_model_file((COMPACT_MODEL_PATH, MODEL_PATH))
+
+
+def ensure_service_running(session, service_url=SERVICE_URL, timeout=SERVICE_START_TIMEOUT):
+    """
+    Start serve.py in the background unless the service already answers /health.
+    """
+    try:
+        session.get(f"{service_url}/health", timeout=2).raise_for_status()
+        return
+    except requests.exceptions.RequestException:
+        pass
+
+    print("Prediction service not running, starting serve.py")
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    subprocess.Popen([sys.executable, os.path.join(src_dir, 'serve.py')], cwd=src_dir,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            session.get(f"{service_url}/health", timeout=2).raise_for_status()
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.5)
+    raise TimeoutError(f"Prediction service did not start within {timeout}s")
+
+
+def hand_off_model(service_url=SERVICE_URL, timeout=HANDOFF_TIMEOUT):
+    """
+    Wait until the running service reports the model now on disk.
+
+    The service's registry watcher swaps the model in; nothing is restarted.
+    The hash is compared against the file the service says it serves, and
+    that file must be the one its registry prefers (the compact export once
+    it exists).
+
+    :return: True if the new version is being served
+    """
+    session = requests.Session()
+    ensure_service_running(session, service_url)
+
+    expected_path = os.path.abspath(served_model_path())
+    expected = file_sha256(expected_path)[:12]
+    reported = None
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = session.get(f"{service_url}/ready", timeout=2)
+            if response.status_code == 200:
+                body = response.json()
+                reported = (body.get('model_path'), body.get('model_version'))
+                if reported == (expected_path, expected):
+                    print(f"Service is serving model version {expected} from {expected_path}")
+                    return True
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        time.sleep(1)
+
+    print(f"Service did not pick up model version {expected} from {expected_path} within {timeout}s"
+          f" (last reported path and version: {reported})")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect data, update the model and hand it to the service")
+    parser.add_argument('--skip-collect', action='store_true')
+    parser.add_argument('--min-new-rows', type=int, default=DEFAULT_MIN_NEW_ROWS)
+    parser.add_argument('--force', action='store_true', help="update the model even if its inputs are unchanged")
+    parser.add_argument('--service-url', default=os.environ.get('PREDICTION_SERVICE_URL', SERVICE_URL))
+    parser.add_argument('--no-handoff', action='store_true',
+                        help="do not start or wait for the prediction service")
+    args = parser.parse_args()
+
+    state = load_state()
+
+    if not args.skip_collect:
+        start_time = time.time()
+        data_file = run_collect()
+        print(f"Collection finished in {time.time() - start_time:.1f}s: {data_file}")
+
+    updated = run_update(state, args.min_new_rows, args.force)
+    if updated:
+        save_state(state)
+
+    if args.no_handoff:
+        return
+    if updated:
+        if not hand_off_model(args.service_url):
+            sys.exit(1)
+    else:
+        ensure_service_running(requests.Session(), args.service_url)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,56 +1,165 @@
 # model_save.py
-import joblib
-import pandas as pd
-from statsmodels.tsa.arima.model import ARIMA
-from flask import Flask, request, jsonify
-import pandas as pd
-import numpy as np
-import joblib
-import traceback
-
+# Heavy libraries (numpy, joblib, statsmodels) are imported only when a model
+# is loaded, which happens in a background thread at startup
+import os
+import threading
+import time
+from flask import Flask, Response, g, request, jsonify
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
+from metrics import PREDICTION_REQUEST_LATENCY
+from accuracy_tracker import DEFAULT_PREDICTION_LOG_PATH, PredictionLog, forecast_origin
+from model_registry import ModelRegistry
+from forecast_cache import ForecastCache
+from model_store import DEFAULT_MAX_RESIDENT, FleetRegistry, ModelStore
 
 
 app = Flask(__name__)
 
-def load_model(filename='../models/model.pkl'):
+PICKLE_MODEL_PATH = '../models/model.pkl'
+COMPACT_MODEL_PATH = '../models/model.npz'
+
+# The compact export loads without statsmodels; the pickle is the fallback
+# for models trained before it existed. The registry re-checks the choice
+# on every poll, so a compact export written later is picked up
+MODEL_PATHS = (COMPACT_MODEL_PATH, PICKLE_MODEL_PATH)
+FLEET_DIR = '../models/fleet'
+# Fixed so memory does not grow with the city list; a batch request holds
+# references to the models it resolved, so eviction cannot break it
+MAX_RESIDENT_CITY_MODELS = DEFAULT_MAX_RESIDENT
+# A city model whose data ends this much earlier than the global model's is
+# considered stale and the global model answers instead
+MAX_CITY_MODEL_LAG_SECONDS = 6 * 60 * 60
+MAX_BATCH_SIZE = 1000
+PREDICTION_LOG_PATH = DEFAULT_PREDICTION_LOG_PATH
+
+# Loaded once per process and hot-reloaded when model_training rewrites the file
+registry = ModelRegistry(MODEL_PATHS)
+
+# Per-city models, loaded lazily with a bound on how many stay in memory
+fleet = FleetRegistry(ModelStore(FLEET_DIR), max_resident=MAX_RESIDENT_CITY_MODELS)
+
+# Forecasts only change with the model, so they are computed once per version
+forecast_cache = ForecastCache(max_models=MAX_RESIDENT_CITY_MODELS + 1)
+registry.add_listener(forecast_cache.refresh)
+
+# Served forecasts, scored later against collected observations
+prediction_log = PredictionLog(PREDICTION_LOG_PATH)
+
+@app.before_request
+def start_request_timer():
+    g.request_start_time = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    start_time = g.get('request_start_time')
+    # Unmatched paths share one label so scans cannot grow the series count
+    if start_time is not None and request.endpoint != 'metrics':
+        PREDICTION_REQUEST_LATENCY.labels(
+            endpoint=request.endpoint or 'unknown',
+            status=response.status_code
+        ).observe(time.perf_counter() - start_time)
+    return response
+
+def load_model():
     try:
-        # Load model with more detailed error handling
-        with open(filename, 'rb') as f:
-            model_data = joblib.load(f)
-        
-        # Validate model data
-        if not model_data or 'model' not in model_data:
-            raise ValueError("Invalid model data structure")
-        
-        return model_data
+        return registry.get()
     except Exception as e:
         print(f"Comprehensive model loading error: {e}")
         return None
+
+def parse_forecast_params(source):
+    """
+    Read and validate the forecast horizon and interval level of a request.
+    """
+    steps = int(source.get('steps', 1))
+    alpha = float(source.get('alpha', 0.05))
+    forecast_cache.validate(steps, alpha)
+    return steps, alpha
+
+def is_stale(model_data, global_data):
+    """
+    True if ``model_data`` ends more than MAX_CITY_MODEL_LAG_SECONDS before the global model.
+    """
+    if not global_data:
+        return False
+    city_origin = forecast_origin(model_data, None)
+    global_origin = forecast_origin(global_data, None)
+    if city_origin is None or global_origin is None:
+        return False
+    return city_origin < global_origin - MAX_CITY_MODEL_LAG_SECONDS
+
+def parse_city(value):
+    """
+    Validate the city of a request.
+    """
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("'city' must be a non-empty string")
+    return value
+
+def resolve_model(city):
+    """
+    Model data used to forecast ``city``.
+
+    Cities with a model in the fleet store get their own model, loaded on
+    first use; all other cities, and cities whose model has fallen behind
+    the global model's data, use the global model.
+
+    :return: Tuple of (model data or None, 'city' or 'global')
+    """
+    global_data = load_model()
+    try:
+        model_data = fleet.get(city)
+        if model_data and not is_stale(model_data, global_data):
+            return model_data, 'city'
+    except Exception as e:
+        print(f"Fleet model loading error for {city}: {e}")
+    return global_data, 'global'
     
 @app.route('/prediction', methods=['POST'])
 def predict_aqi():
     try:
-        # Load the ARIMA model
-        model_data = load_model()
+        # Accept parameters from the JSON body or the query string
+        body = request.get_json(silent=True)
+        if body is not None and not isinstance(body, dict):
+            return jsonify({"error": "Invalid request: body must be a JSON object"}), 400
+        params = {**request.args.to_dict(), **(body or {})}
+        try:
+            steps, alpha = parse_forecast_params(params)
+            city = parse_city(params['city']) if 'city' in params else None
+        except (TypeError, ValueError) as param_error:
+            return jsonify({"error": f"Invalid request: {str(param_error)}"}), 400
+        
+        # Load the ARIMA model, per city when one is requested
+        if city:
+            model_data, model_scope = resolve_model(city)
+        else:
+            model_data, model_scope = load_model(), 'global'
         if not model_data:
             return jsonify({"error": "Could not load model"}), 500
         
-        # Extract ARIMA model
-        model = model_data['model']
         model_order = model_data['order']
         
         try:
-            # Forecast next AQI value
-            forecast = model.get_forecast(steps=1)
+            # Cached forecast for the requested horizon
+            predicted_mean, lower, upper = forecast_cache.get(model_data, steps, alpha)
             
-            predicted_mean = float(forecast.predicted_mean.values[0])
-            conf_int = forecast.conf_int(alpha=0.05)
+            # Only forecasts for a city can be matched with observations
+            if city:
+                try:
+                    prediction_log.append(model_data, city, steps, alpha, predicted_mean, lower, upper,
+                                          model_scope)
+                except Exception as log_error:
+                    print(f"Prediction logging error: {log_error}")
             
             return jsonify({
                 "predicted_aqi": predicted_mean,
-                "prediction_interval_lower": float(conf_int.values[0][0]),
-                "prediction_interval_upper": float(conf_int.values[0][1]),
-                "model_order": model_order
+                "prediction_interval_lower": lower,
+                "prediction_interval_upper": upper,
+                "steps": steps,
+                "alpha": alpha,
+                "model_order": model_order,
+                "model_version": model_data['version'],
+                "model_scope": model_scope
             })
         
         except Exception as forecast_error:
@@ -63,14 +172,129 @@ def predict_aqi():
             "error": f"Unexpected error: {str(e)}"
         }), 500
 
+@app.route('/predictions/batch', methods=['POST'])
+def predict_aqi_batch():
+    """
+    Forecast several (city, horizon, alpha) entries in one request.
+
+    Expects a JSON body of the form
+    {"requests": [{"city": "Lahore", "horizon": 24, "alpha": 0.05}, ...]}
+    and returns the forecast path for horizons 1..horizon of every entry.
+    Each prediction's model_scope tells whether the city's own model or the
+    global fallback produced it.
+    """
+    try:
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({"error": "Invalid request: body must be a JSON object"}), 400
+        entries = payload.get('requests')
+        if not isinstance(entries, list) or not entries:
+            return jsonify({"error": "Invalid request: 'requests' must be a non-empty list"}), 400
+        if len(entries) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Invalid request: at most {MAX_BATCH_SIZE} entries allowed"}), 400
+        
+        # Validate every entry before forecasting anything
+        parsed = []
+        for index, entry in enumerate(entries):
+            try:
+                if not isinstance(entry, dict):
+                    raise TypeError("entry must be a JSON object")
+                city = parse_city(entry['city'])
+                horizon, alpha = parse_forecast_params({
+                    'steps': entry.get('horizon', 1),
+                    'alpha': entry.get('alpha', 0.05)
+                })
+            except (KeyError, TypeError, ValueError, AttributeError) as param_error:
+                return jsonify({"error": f"Invalid request entry {index}: {str(param_error)}"}), 400
+            parsed.append((city, horizon, alpha))
+        
+        models = {}
+        scopes = {}
+        for city, _, _ in parsed:
+            if city not in models:
+                model_data, scopes[city] = resolve_model(city)
+                if not model_data:
+                    return jsonify({"error": f"Could not load model for {city}"}), 500
+                models[city] = model_data
+        
+        # Forecasts of all uncached models are computed in one batched pass;
+        # entries sharing a model and alpha share one vectorised path
+        snapshots = forecast_cache.refresh_many(models.values())
+        paths = {}
+        predictions = []
+        for city, horizon, alpha in parsed:
+            model_data = models[city]
+            key = (model_data['version'], alpha)
+            if key not in paths:
+                paths[key] = forecast_cache.snapshot_paths(snapshots[model_data['version']], alpha)
+            mean, lower, upper = paths[key]
+            
+            predictions.append({
+                "city": city,
+                "horizon": horizon,
+                "alpha": alpha,
+                "predicted_aqi": mean[:horizon].tolist(),
+                "prediction_interval_lower": lower[:horizon].tolist(),
+                "prediction_interval_upper": upper[:horizon].tolist(),
+                "model_order": model_data['order'],
+                "model_version": model_data['version'],
+                "model_scope": scopes[city]
+            })
+        
+        return jsonify({"predictions": predictions})
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Unexpected error: {str(e)}"
+        }), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """
-    Health check endpoint to verify API is running.
+    Liveness check: constant time, no model access or outbound requests.
     """
-    example_prediction_usage()
     return jsonify({"status": "healthy"}), 200
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness check reporting the in-memory model state.
+    
+    Returns 503 until the global model has been loaded.
+    """
+    model_data = registry.current()
+    if model_data is None:
+        return jsonify({"status": "not ready", "model_loaded": False}), 503
+    
+    now = time.time()
+    # Age of the model's data: since its last training or incremental update
+    updated_at = model_data.get('updated_at', model_data.get('trained_at'))
+    return jsonify({
+        "status": "ready",
+        "model_loaded": True,
+        "model_version": model_data['version'],
+        "model_order": model_data['order'],
+        "model_path": os.path.abspath(model_data['path']),
+        "loaded_seconds_ago": now - model_data['loaded_at'],
+        "model_age_seconds": now - updated_at if updated_at is not None else None
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics of the service.
+    
+    Under gunicorn (see serve.py) every worker writes its samples to
+    PROMETHEUS_MULTIPROC_DIR and whichever worker takes the scrape
+    aggregates all of them.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        metrics_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(metrics_registry)
+    else:
+        metrics_registry = REGISTRY
+    return Response(generate_latest(metrics_registry), mimetype=CONTENT_TYPE_LATEST)
+
 def example_prediction_usage():
     """
     Example script demonstrating how to use the prediction API
@@ -89,6 +313,28 @@ def example_prediction_usage():
     print(response.json())
 
 
+def preload_model():
+    """
+    Load the model (and its forecast cache) before the first request, then watch for updates.
+    """
+    start_time = time.perf_counter()
+    if registry.reload_if_changed():
+        print(f"Model preloaded in {time.perf_counter() - start_time:.3f}s")
+    registry.start_watcher()
+
+def start_background_services():
+    """
+    Preload the model in a background thread so the server can accept
+    requests immediately. /ready reports readiness once the model is loaded;
+    /health is liveness only and answers from the start.
+    """
+    thread = threading.Thread(target=preload_model, daemon=True)
+    thread.start()
+    return thread
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    start_background_services()
+    # The reloader would fork a second process with its own registry
+    app.run(host='0.0.0.0', port=8000, debug=True, use_reloader=False)
     
@@ -29,40 +29,13 @@ cd "/home/abdulrafay/mlops/course-project-abdul-rafay-1/src" || {
     exit 1
 }
 
-restart_flask() {
-    # Find and kill existing Flask processes
-    pkill -f "/usr/bin/python3 prediction_service.py"
-    
-    # Start Flask in the background
-    /usr/bin/python3 prediction_service.py &
-
-    
-    # Check if Flask started successfully
-    if [ $? -eq 0 ]; then
-        log "Flask application restarted successfully"
-    else
-        log "Failed to restart Flask application"
-        exit 1
-    fi
-}
-
-#!/bin/bash
-
-if /usr/bin/python3 data_collection.py; then
-    log "Data collection script completed successfully"
-    
-    if /usr/bin/python3 model_training.py; then
-        log "Model training script completed successfully"
-        
-        restart_flask
-        exit 0
-    else
-        log "Model training script failed"
-        exit 1
-    fi
+# Collection, the model update (skipped when the data barely changed),
+# queued DVC versioning and the hand-off to the running service are all
+# handled by pipeline.py
+if /usr/bin/python3 pipeline.py >> "$LOG_FILE" 2>&1; then
+    log "Pipeline completed successfully"
+    exit 0
 else
-    log "Data collection script failed"
+    log "Pipeline failed"
     exit 1
 fi
-log "Data collection script failed after $max_tries attempts"
-exit 1
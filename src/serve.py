@@ -0,0 +1,100 @@
+import argparse
+import gc
+import glob
+import os
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+DEFAULT_BIND = '0.0.0.0:8000'
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_THREADS = 4
+DEFAULT_GRACEFUL_TIMEOUT = 30
+DEFAULT_METRICS_DIR = os.path.join(tempfile.gettempdir(), 'prediction_service_metrics')
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork, so each worker starts its own watcher
+    from prediction_service import registry
+    registry.start_watcher()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def prepare_metrics_dir(path):
+    """
+    Point prometheus_client's multiprocess mode at an empty ``path``.
+
+    Must run before prometheus_client is imported; samples left over from a
+    previous server would otherwise be added to the new one's.
+    """
+    os.makedirs(path, exist_ok=True)
+    for filename in glob.glob(os.path.join(path, '*.db')):
+        os.remove(filename)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = path
+
+
+class PredictionServer(BaseApplication):
+    """
+    Gunicorn application serving prediction_service with preload-before-fork.
+
+    The app is imported and the model loaded once in the master process;
+    workers are forked afterwards and share those pages copy-on-write.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from prediction_service import app, registry
+
+        # Load synchronously in the master; the forecast cache is warmed by
+        # the registry listener
+        registry.reload_if_changed()
+
+        # Move everything allocated so far out of the GC's reach so
+        # collections in the workers do not touch (and copy) shared pages
+        gc.freeze()
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the prediction service with gunicorn")
+    parser.add_argument('--bind', default=os.environ.get('PREDICTION_BIND', DEFAULT_BIND))
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('PREDICTION_WORKERS', DEFAULT_WORKERS)))
+    parser.add_argument('--threads', type=int,
+                        default=int(os.environ.get('PREDICTION_THREADS', DEFAULT_THREADS)))
+    parser.add_argument('--graceful-timeout', type=int,
+                        default=int(os.environ.get('PREDICTION_GRACEFUL_TIMEOUT', DEFAULT_GRACEFUL_TIMEOUT)))
+    parser.add_argument('--metrics-dir',
+                        default=os.environ.get('PROMETHEUS_MULTIPROC_DIR', DEFAULT_METRICS_DIR))
+    args = parser.parse_args()
+
+    # Workers share metrics through files in this directory
+    prepare_metrics_dir(args.metrics_dir)
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        # SIGTERM lets in-flight requests finish within this window
+        'graceful_timeout': args.graceful_timeout,
+        'post_fork': post_fork,
+        'child_exit': child_exit
+    }
+    PredictionServer(options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from data_preprocessing import PARQUET_DATA_DIR, parse_timestamps
+
+# Typed columns of one collection row; date and city are partition keys
+DATA_SCHEMA = pa.schema([
+    ('country', pa.string()),
+    ('timestamp', pa.timestamp('us')),
+    ('temperature', pa.float64()),
+    ('humidity', pa.float64()),
+    ('wind_speed', pa.float64()),
+    ('aqi', pa.float64()),
+    ('co', pa.float64()),
+    ('no', pa.float64()),
+    ('no2', pa.float64()),
+    ('o3', pa.float64()),
+    ('so2', pa.float64()),
+    ('pm2_5', pa.float64()),
+    ('pm10', pa.float64()),
+    ('main_pollutant', pa.string())
+])
+
+PARTITION_SCHEMA = pa.schema([('date', pa.string()), ('city', pa.string())])
+
+# Partitions with at least this many files are merged by compact()
+COMPACTION_MIN_FILES = 8
+
+
+class ParquetStore:
+    """
+    Collection rows stored as Parquet files partitioned by date and city.
+
+    Each collection run appends one small file per partition; compact()
+    merges them so reads are not dominated by per-file overhead. Reads go
+    through pyarrow datasets, so only the requested columns are decoded and
+    date/city filters prune whole partitions.
+    """
+
+    def __init__(self, base_dir=PARQUET_DATA_DIR):
+        """
+        :param base_dir: Root directory of the partitioned dataset
+        """
+        self.base_dir = base_dir
+        self.partitioning = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def append(self, df):
+        """
+        Append collected rows to the store.
+
+        :param df: DataFrame in the collector's CSV schema
+        :return: Number of rows written
+        """
+        df = df.copy()
+        df['timestamp'] = parse_timestamps(df['timestamp'])
+        df['date'] = df['timestamp'].dt.strftime('%Y-%m-%d')
+
+        full_schema = pa.schema(list(DATA_SCHEMA) + list(PARTITION_SCHEMA))
+        for field in full_schema:
+            if field.name not in df.columns:
+                df[field.name] = None
+            elif pa.types.is_floating(field.type):
+                df[field.name] = pd.to_numeric(df[field.name], errors='coerce').astype(float)
+        table = pa.Table.from_pandas(df[full_schema.names], schema=full_schema, preserve_index=False)
+
+        ds.write_dataset(
+            table,
+            self.base_dir,
+            format='parquet',
+            partitioning=self.partitioning,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        return table.num_rows
+
+    def _dataset(self):
+        return ds.dataset(self.base_dir, schema=pa.schema(list(DATA_SCHEMA) + list(PARTITION_SCHEMA)),
+                          format='parquet', partitioning=self.partitioning)
+
+    def read(self, columns=None, start=None, end=None, cities=None):
+        """
+        Read rows from the store.
+
+        :param columns: Columns to load, all columns if None
+        :param start: Inclusive lower bound on timestamp
+        :param end: Exclusive upper bound on timestamp
+        :param cities: Cities to load, all cities if None
+        :return: DataFrame of the matching rows
+        """
+        expression = None
+
+        def combine(condition):
+            return condition if expression is None else expression & condition
+
+        # Conditions on the partition keys prune whole directories
+        if start is not None:
+            start = pd.Timestamp(start)
+            expression = combine(ds.field('date') >= start.strftime('%Y-%m-%d'))
+            expression = combine(ds.field('timestamp') >= pa.scalar(start.to_pydatetime(), pa.timestamp('us')))
+        if end is not None:
+            end = pd.Timestamp(end)
+            expression = combine(ds.field('date') <= end.strftime('%Y-%m-%d'))
+            expression = combine(ds.field('timestamp') < pa.scalar(end.to_pydatetime(), pa.timestamp('us')))
+        if cities is not None:
+            expression = combine(ds.field('city').isin(list(cities)))
+
+        table = self._dataset().to_table(columns=columns, filter=expression)
+        return table.to_pandas()
+
+    def compact(self, min_files=COMPACTION_MIN_FILES):
+        """
+        Merge the small files of each partition into a single file.
+
+        :param min_files: Only partitions with at least this many files are merged
+        :return: Number of partitions compacted
+        """
+        compacted = 0
+        for root, _, files in os.walk(self.base_dir):
+            parts = sorted(f for f in files if f.endswith('.parquet'))
+            if len(parts) < min_files:
+                continue
+
+            paths = [os.path.join(root, f) for f in parts]
+            table = pa.concat_tables([pq.read_table(path, schema=DATA_SCHEMA) for path in paths])
+            table = table.sort_by('timestamp')
+
+            # Write the merged file before removing the originals; the
+            # dot prefix hides the temporary file from dataset discovery
+            name = f"part-compacted-{uuid.uuid4().hex}.parquet"
+            tmp_path = os.path.join(root, f".{name}.tmp")
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, os.path.join(root, name))
+            for path in paths:
+                os.remove(path)
+            compacted += 1
+
+        return compacted
@@ -0,0 +1,212 @@
+import os
+import math
+
+import numpy as np
+import pandas as pd
+
+from data_preprocessing import FEATURES, TARGET, parse_timestamps
+from metrics import ROWS_DROPPED
+
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_SKETCH_SIZE = 200
+
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch in the style of KLL.
+
+    Items live in levels; an item at level i stands for 2**i observations.
+    When a level exceeds its capacity it is sorted and every other item
+    (random offset) is promoted to the next level. Memory is O(k log n)
+    and rank error is roughly 1/k regardless of how many rows are seen,
+    and two sketches of disjoint data merge into a sketch of their union.
+    """
+
+    def __init__(self, k=DEFAULT_SKETCH_SIZE, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        while True:
+            for level, items in enumerate(self.levels):
+                if len(items) > self._capacity(level):
+                    break
+            else:
+                return
+
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+
+            items = np.sort(items)
+            # An odd item out stays at its level
+            leftover, items = items[:len(items) % 2], items[len(items) % 2:]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            self.levels[level] = leftover
+
+    def update(self, values):
+        """
+        Add an array of observations; NaNs are ignored.
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+
+    def update_weighted(self, value, weight):
+        """
+        Add ``weight`` copies of ``value`` without materialising them.
+        """
+        weight = int(weight)
+        if weight <= 0 or np.isnan(value):
+            return
+        self.count += weight
+        level = 0
+        while weight:
+            if weight & 1:
+                while len(self.levels) <= level:
+                    self.levels.append(np.empty(0))
+                self.levels[level] = np.append(self.levels[level], value)
+            weight >>= 1
+            level += 1
+        self._compress()
+
+    def merge(self, other):
+        """
+        Fold another sketch into this one.
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Approximate q-quantile of everything added so far, NaN if empty.
+        """
+        if not self.count:
+            return float('nan')
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        index = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        return float(values[order][min(index, len(values) - 1)])
+
+
+def list_csv_files(directory):
+    return [os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.endswith('.csv')]
+
+
+def iter_csv_chunks(files, columns, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yield DataFrame chunks of ``columns`` from each file in turn.
+
+    :param files: CSV paths in time order
+    :param columns: Columns to parse
+    :param chunksize: Rows per chunk
+    """
+    wanted = set(columns)
+    for file_path in files:
+        try:
+            for chunk in pd.read_csv(file_path, usecols=lambda column: column in wanted, chunksize=chunksize):
+                yield chunk
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+
+
+def fit_cleaning_params_streaming(chunks, columns=None, k=DEFAULT_SKETCH_SIZE):
+    """
+    Streaming equivalent of data_preprocessing.fit_cleaning_params.
+
+    Medians come from one sketch per column. The quartiles are those of the
+    median-imputed column, obtained by adding the missing count as a single
+    weighted median item rather than a second pass.
+
+    :param chunks: Iterable of DataFrame chunks
+    :param columns: Columns to clean, defaults to features and target
+    :param k: Sketch size; larger is more accurate
+    :return: Cleaning parameters in the fit_cleaning_params format
+    """
+    columns = columns or FEATURES + [TARGET]
+    sketches = {column: KLLSketch(k) for column in columns}
+    missing = dict.fromkeys(columns, 0)
+
+    for chunk in chunks:
+        for column in columns:
+            values = chunk[column].to_numpy(dtype=float, na_value=np.nan)
+            missing[column] += int(np.isnan(values).sum())
+            sketches[column].update(values)
+
+    medians, lower, upper = {}, {}, {}
+    for column in columns:
+        sketch = sketches[column]
+        medians[column] = sketch.quantile(0.5)
+        sketch.update_weighted(medians[column], missing[column])
+        q1, q3 = sketch.quantile(0.25), sketch.quantile(0.75)
+        iqr = q3 - q1
+        lower[column] = q1 - 1.5 * iqr
+        upper[column] = q3 + 1.5 * iqr
+
+    return {'columns': list(columns), 'medians': medians, 'lower': lower, 'upper': upper}
+
+
+def iter_cleaned_target(chunks, cleaning_params, target=TARGET):
+    """
+    Impute and filter each chunk, yielding only the target values and timestamps.
+
+    :param chunks: Iterable of DataFrame chunks
+    :param cleaning_params: Output of fit_cleaning_params_streaming
+    :param target: Column to emit
+    """
+    columns = cleaning_params['columns']
+    medians = pd.Series(cleaning_params['medians'])[columns]
+    lower = pd.Series(cleaning_params['lower'])[columns]
+    upper = pd.Series(cleaning_params['upper'])[columns]
+
+    for chunk in chunks:
+        filled = chunk[columns].fillna(medians)
+        mask = ((filled >= lower) & (filled <= upper)).all(axis=1).to_numpy()
+        ROWS_DROPPED.labels(reason='iqr').inc(int(len(mask) - mask.sum()))
+        yield filled[target].to_numpy(dtype=float)[mask], chunk['timestamp'].to_numpy()[mask]
+
+
+def stream_target_series(files, chunksize=DEFAULT_CHUNKSIZE, k=DEFAULT_SKETCH_SIZE):
+    """
+    Two streaming passes over ``files``: fit cleaning parameters, then emit the cleaned target.
+
+    Peak memory is one chunk plus the target column, independent of how
+    many feature columns or files there are.
+
+    :param files: CSV paths in time order
+    :param chunksize: Rows per chunk
+    :param k: Sketch size
+    :return: Tuple of (target series with a RangeIndex, cleaning params, last timestamp)
+    """
+    columns = FEATURES + [TARGET]
+    cleaning_params = fit_cleaning_params_streaming(iter_csv_chunks(files, columns, chunksize), columns, k)
+
+    parts = []
+    last_timestamp = None
+    for values, timestamps in iter_cleaned_target(
+            iter_csv_chunks(files, columns + ['timestamp'], chunksize), cleaning_params):
+        parts.append(values)
+        if len(timestamps):
+            chunk_max = parse_timestamps(timestamps).max()
+            if last_timestamp is None or chunk_max > last_timestamp:
+                last_timestamp = chunk_max
+
+    values = np.concatenate(parts) if parts else np.empty(0)
+    return pd.Series(values, name=TARGET), cleaning_params, last_timestamp
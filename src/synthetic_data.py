@@ -0,0 +1,139 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_preprocessing import FEATURES
+
+# Column order of the CSVs written by EnvironmentalDataCollector
+CSV_COLUMNS = ['city', 'country', 'timestamp', 'temperature', 'humidity', 'wind_speed', 'aqi',
+               'co', 'no', 'no2', 'o3', 'so2', 'pm2_5', 'pm10', 'main_pollutant']
+
+# Typical level and spread of each pollutant / weather feature
+FEATURE_SCALES = {
+    'temperature': (20.0, 8.0),
+    'humidity': (55.0, 15.0),
+    'wind_speed': (3.0, 1.5),
+    'co': (400.0, 120.0),
+    'no': (5.0, 3.0),
+    'no2': (25.0, 10.0),
+    'o3': (60.0, 20.0),
+    'so2': (10.0, 5.0),
+    'pm2_5': (45.0, 20.0),
+    'pm10': (80.0, 30.0)
+}
+
+
+def make_cities(count, seed=0):
+    """
+    Synthetic city definitions in the shape of Config.CITIES.
+
+    :param count: Number of cities
+    :param seed: Random seed
+    :return: List of dicts with name, country, lat and lon
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'name': f"City{index:04d}",
+            'country': 'Synthetic',
+            'lat': float(rng.uniform(-60, 60)),
+            'lon': float(rng.uniform(-180, 180))
+        }
+        for index in range(count)
+    ]
+
+
+def generate_environmental_data(cities=10, days=30, samples_per_day=24, missing_fraction=0.01,
+                                outlier_fraction=0.005, seed=0):
+    """
+    Multi-city environmental observations in the collector's CSV schema.
+
+    AQI follows a per-city level with a daily cycle and AR(1) noise, so the
+    series has the autocorrelation ARIMA models are fitted to. A small share
+    of values is blanked or inflated so imputation and the IQR filter do
+    real work.
+
+    :param cities: Number of cities, or a list of city dicts
+    :param days: Number of days covered
+    :param samples_per_day: Collection runs per day
+    :param missing_fraction: Share of feature values set to NaN
+    :param outlier_fraction: Share of AQI values multiplied into outliers
+    :param seed: Random seed
+    :return: DataFrame with CSV_COLUMNS, ordered by timestamp then city
+    """
+    rng = np.random.default_rng(seed)
+    city_list = make_cities(cities, seed) if isinstance(cities, int) else list(cities)
+    n_cities = len(city_list)
+    n_steps = days * samples_per_day
+
+    timestamps = pd.Timestamp('2024-01-01') + pd.to_timedelta(
+        np.arange(n_steps) * (86400 / samples_per_day), unit='s')
+
+    # AR(1) noise, vectorised across cities
+    noise = np.empty((n_steps, n_cities))
+    noise[0] = rng.normal(0, 10, n_cities)
+    shocks = rng.normal(0, 10 * np.sqrt(1 - 0.8 ** 2), (n_steps, n_cities))
+    for step in range(1, n_steps):
+        noise[step] = 0.8 * noise[step - 1] + shocks[step]
+
+    level = rng.uniform(40, 150, n_cities)
+    daily = 15 * np.sin(2 * np.pi * np.arange(n_steps) / samples_per_day)[:, None]
+    aqi = np.clip(level + daily + noise, 0, None)
+    outliers = rng.random(aqi.shape) < outlier_fraction
+    aqi[outliers] *= rng.uniform(3, 6, outliers.sum())
+
+    size = n_steps * n_cities
+    data = {
+        'city': np.tile([city['name'] for city in city_list], n_steps),
+        'country': np.tile([city['country'] for city in city_list], n_steps),
+        'timestamp': np.repeat(timestamps.strftime('%Y-%m-%dT%H:%M:%S.%f'), n_cities),
+        'aqi': np.round(aqi.ravel())
+    }
+    for column in FEATURES:
+        mean, std = FEATURE_SCALES[column]
+        values = np.abs(rng.normal(mean, std, size))
+        values[rng.random(size) < missing_fraction] = np.nan
+        data[column] = values
+    data['main_pollutant'] = rng.choice(['p2', 'p1', 'o3', 'n2'], size)
+
+    return pd.DataFrame(data)[CSV_COLUMNS]
+
+
+def write_csv_files(df, directory, runs_per_file=1):
+    """
+    Write ``df`` as the collector would: one CSV per collection run.
+
+    :param df: Output of generate_environmental_data
+    :param directory: Destination directory
+    :param runs_per_file: Collection runs (timestamps) grouped into one file
+    :return: Number of files written
+    """
+    os.makedirs(directory, exist_ok=True)
+    file_index = pd.factorize(df['timestamp'])[0] // runs_per_file
+    count = 0
+    for _, chunk in df.groupby(file_index, sort=True):
+        stamp = pd.Timestamp(chunk['timestamp'].iloc[0]).strftime('%Y%m%d_%H%M%S')
+        chunk.to_csv(os.path.join(directory, f"environmental_data_{stamp}.csv"), index=False)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic multi-city environmental CSVs")
+    parser.add_argument('directory')
+    parser.add_argument('--cities', type=int, default=10)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--samples-per-day', type=int, default=24)
+    parser.add_argument('--runs-per-file', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = generate_environmental_data(args.cities, args.days, args.samples_per_day, seed=args.seed)
+    files = write_csv_files(df, args.directory, args.runs_per_file)
+    print(f"Wrote {len(df)} rows in {files} files to {args.directory}")
+
+
+if __name__ == '__main__':
+    main()
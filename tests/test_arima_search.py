@@ -0,0 +1,31 @@
+from unittest import mock
+
+import numpy as np
+from statsmodels.tsa.arima.model import ARIMA
+
+import arima_search
+
+
+def test_rejected_warm_start_falls_back_to_cold_refit():
+    rng = np.random.default_rng(0)
+    series = 80 + np.convolve(rng.normal(0, 5, 300), [1, 0.5], mode='same')
+    arima_search._init_worker(series, None)
+
+    original_fit = ARIMA.fit
+    calls = []
+
+    # Runs the real fit first so the cold refit sees whatever it left behind
+    def rejecting_fit(self, *args, **kwargs):
+        calls.append(kwargs.get('start_params') is not None)
+        fitted = original_fit(self, *args, **kwargs)
+        if calls[-1]:
+            raise ValueError("rejected warm start")
+        return fitted
+
+    with mock.patch.object(ARIMA, 'fit', autospec=True, side_effect=rejecting_fit):
+        result = arima_search.fit_information_criterion(
+            (1, 0, 1), previous_params={'ar.L1': 0.5, 'ma.L1': 0.3})
+
+    assert calls == [True, False]
+    assert result['error'] is None
+    assert np.isfinite(result['aic'])
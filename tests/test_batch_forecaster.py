@@ -0,0 +1,79 @@
+import warnings
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+from statsmodels.tsa.arima.model import ARIMA
+
+from batch_forecaster import BatchForecaster
+from compact_model import CompactARIMA, export_compact
+
+ORDERS = [(1, 0, 0), (2, 1, 1), (0, 1, 1), (1, 1, 0), (2, 0, 2), (1, 0, 1)]
+STEPS = 48
+ALPHA = 0.05
+
+
+def fit_series(order, seed):
+    rng = np.random.default_rng(seed)
+    series = 80 + np.convolve(rng.normal(0, 5, 300), [1, 0.6, 0.3], mode='same')
+    if order[1]:
+        series = np.cumsum(series - series.mean()) / 10 + 80
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return ARIMA(series, order=order).fit()
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    return [(order, fit_series(order, seed)) for seed, order in enumerate(ORDERS)]
+
+
+def assert_matches(expected, mean, lower, upper):
+    expected_interval = np.asarray(expected.conf_int(alpha=ALPHA))
+    np.testing.assert_allclose(mean, expected.predicted_mean, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(lower, expected_interval[:, 0], rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(upper, expected_interval[:, 1], rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize('index', range(len(ORDERS)))
+def test_compact_forecast_matches_statsmodels(fitted, index):
+    order, results = fitted[index]
+    forecast = CompactARIMA.from_results(results, order).get_forecast(STEPS)
+    interval = forecast.conf_int(alpha=ALPHA)
+    assert_matches(results.get_forecast(steps=STEPS), forecast.predicted_mean, interval[:, 0], interval[:, 1])
+
+
+def test_exported_model_matches_statsmodels(fitted, tmp_path):
+    order, results = fitted[1]
+    filename = export_compact(results, order, str(tmp_path / 'model.npz'), {'trained_at': 1.0})
+    model = CompactARIMA.load(filename)
+    forecast = model.get_forecast(STEPS)
+    interval = forecast.conf_int(alpha=ALPHA)
+    assert model.metadata == {'trained_at': 1.0}
+    assert_matches(results.get_forecast(steps=STEPS), forecast.predicted_mean, interval[:, 0], interval[:, 1])
+
+
+def test_batch_forecast_matches_statsmodels(fitted):
+    models = [CompactARIMA.from_results(results, order) for order, results in fitted]
+    mean, variance = BatchForecaster(models).forecast(STEPS)
+    half_width = NormalDist().inv_cdf(1 - ALPHA / 2) * np.sqrt(variance)
+    for row, (_, results) in enumerate(fitted):
+        assert_matches(results.get_forecast(steps=STEPS), mean[row],
+                       mean[row] - half_width[row], mean[row] + half_width[row])
+
+
+def test_registry_serves_compact_export_matching_pickle(fitted, tmp_path):
+    import joblib
+    from model_registry import ModelRegistry
+
+    order, results = fitted[2]
+    pickle_path = str(tmp_path / 'model.pkl')
+    joblib.dump({'model': results, 'order': order}, pickle_path)
+    compact_path = export_compact(results, order, str(tmp_path / 'model.npz'))
+
+    model_data = ModelRegistry((compact_path, pickle_path)).get()
+    assert model_data['path'] == compact_path
+    assert isinstance(model_data['model'], CompactARIMA)
+    forecast = model_data['model'].get_forecast(STEPS)
+    interval = forecast.conf_int(alpha=ALPHA)
+    assert_matches(results.get_forecast(steps=STEPS), forecast.predicted_mean, interval[:, 0], interval[:, 1])